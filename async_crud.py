@@ -0,0 +1,52 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud
+
+# Async counterparts of the crud functions used by the async route handlers.
+# Each runs the sync implementation through AsyncSession.run_sync, so the SQL
+# is identical while I/O goes through the asyncio driver and yields to the
+# event loop instead of blocking it.
+
+async def create_user(db: AsyncSession, user, hashed_password: str):
+    return await db.run_sync(crud.create_user, user, hashed_password)
+
+async def get_user_by_username(db: AsyncSession, username: str):
+    return await db.run_sync(crud.get_user_by_username, username)
+
+async def get_user_by_id(db: AsyncSession, user_id: int):
+    return await db.run_sync(crud.get_user_by_id, user_id)
+
+async def get_users_by_ids(db: AsyncSession, user_ids):
+    return await db.run_sync(crud.get_users_by_ids, user_ids)
+
+async def update_user(db: AsyncSession, user):
+    return await db.run_sync(crud.update_user, user)
+
+async def create_request(db: AsyncSession, request_data: dict):
+    return await db.run_sync(crud.create_request, request_data)
+
+async def get_request_by_id(db: AsyncSession, request_id: int):
+    return await db.run_sync(crud.get_request_by_id, request_id)
+
+async def update_request(db: AsyncSession, request_obj):
+    return await db.run_sync(crud.update_request, request_obj)
+
+async def requests_version(db: AsyncSession, user_id: int, **filters):
+    return await db.run_sync(crud.requests_version, user_id, **filters)
+
+async def list_requests_for_user(db: AsyncSession, user_id: int, **filters):
+    return await db.run_sync(crud.list_requests_for_user, user_id, **filters)
+
+async def search_requests(db: AsyncSession, user_id: int, **filters):
+    return await db.run_sync(crud.search_requests, user_id, **filters)
+
+async def list_pending_requests(db: AsyncSession, user_id: int, limit: int = None):
+    return await db.run_sync(crud.list_pending_requests, user_id, limit)
+
+async def delete_approver_actions_by_request(db: AsyncSession, request_id: int):
+    return await db.run_sync(crud.delete_approver_actions_by_request, request_id)
+
+async def acquire_file_blob(db: AsyncSession, sha256: str, path: str, size: int):
+    return await db.run_sync(crud.acquire_file_blob, sha256, path, size)
+
+async def create_token(db: AsyncSession, token_hash: str, details: dict):
+    return await db.run_sync(crud.create_token, token_hash, details)
@@ -1,20 +1,34 @@
-from passlib.context import CryptContext
-from datetime import datetime, timedelta
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+import hashlib
+import time
 from jose import JWTError, jwt
 import schemas, crud, models
-from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from passwords import pwd_context
+from cache import TTLCache
+from config import (
+    SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, PRINCIPAL_CACHE_TTL_SECONDS, PRINCIPAL_CACHE_MAX_ENTRIES
+)
 from fastapi import Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import get_db
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from database import get_db, get_async_db
 
+# Blocking helpers for scripts; request handlers go through passwords.py.
 def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str):
     return pwd_context.hash(password)
 
+def token_hash(token: str):
+    # Sessions are stored and looked up by this digest rather than the JWT.
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def token_expiry(token: str):
+    return datetime.fromtimestamp(jwt.get_unverified_claims(token)["exp"], timezone.utc)
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta if expires_delta else timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -22,7 +36,34 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    """Detached snapshot of the user behind a verified token."""
+    id: int
+    username: str
+    name: str
+    role: Tuple[int, ...]
+    email: str
+
+    @classmethod
+    def from_user(cls, user: models.User):
+        return cls(id=user.id, username=user.username, name=user.name, role=tuple(user.role or ()), email=user.email)
+
+principal_cache = TTLCache(PRINCIPAL_CACHE_MAX_ENTRIES, PRINCIPAL_CACHE_TTL_SECONDS)
+
+def invalidate_token(token: str):
+    principal_cache.pop(token)
+
+def invalidate_user(user_id: int):
+    principal_cache.discard_where(lambda token, user: user.id == user_id)
+
+def invalidate_all_tokens():
+    principal_cache.clear()
+
 def get_current_user(token: str, db: Session):
+    cached = principal_cache.get(token)
+    if cached is not None:
+        return cached
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid token",
@@ -39,8 +80,14 @@ def get_current_user(token: str, db: Session):
     user = crud.get_user_by_id(db, token_data.user_id)
     if user is None:
         raise credentials_exception
-    return user
+    principal = AuthenticatedUser.from_user(user)
+    principal_cache.set(token, principal, ttl=payload.get("exp", 0) - time.time())
+    return principal
 
 # Expose an oauth2_scheme instance for dependency injection in routes.
 from fastapi.security import OAuth2PasswordBearer
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    # Dependency for async handlers; shares the handler's AsyncSession.
+    return await db.run_sync(lambda session: get_current_user(token, session))
@@ -0,0 +1,110 @@
+"""Race concurrent approvals of the same stage and check none is lost.
+
+For each of --requests pending reviews from the benchmarks.seed manifest,
+the stage's approver (POST /requests/review) and --admins admins (half
+through /requests/review, half through /admin/requests/stage-approve)
+approve the request at once, each naming the stage it read. Exactly one of
+them must succeed, advancing the request by exactly one stage and adding
+exactly one approver action; the others get 400 or 409. A lost update, or an
+admin's decision landing on a later stage it never saw, fails the check.
+The same race is covered by tests/test_workflow.py. Also reports the SQL statements spent on an uncontended approval.
+Exits with status 1 when any check fails.
+
+    pip install -r benchmarks/requirements.txt  # httpx
+    python -m benchmarks.approval_race --url $URL --async-url $ASYNC_URL
+"""
+import argparse
+import asyncio
+import json
+import sys
+import httpx
+from sqlalchemy import func, select
+
+from benchmarks import suite
+
+def _snapshot(request_ids):
+    import database, models
+    with database.SessionLocal() as db:
+        rows = db.execute(select(models.Request.id, models.Request.status, models.Request.current_approver_index,
+                                 models.Request.approvers).where(models.Request.id.in_(request_ids))).all()
+        actions = dict(db.execute(
+            select(models.ApproverAction.request_id, func.count()).where(
+                models.ApproverAction.request_id.in_(request_ids)).group_by(models.ApproverAction.request_id)
+        ).all())
+    return {r.id: {"status": r.status, "index": r.current_approver_index, "approvers": r.approvers, "actions": actions.get(r.id, 0)}
+            for r in rows}
+
+def _awaits(request, reviewer_id):
+    return request["status"] == "IN_PROGRESS" and request["approvers"][request["index"]] == reviewer_id
+
+def _contenders(item, admins, index):
+    body = {"request_id": item["request_id"], "approved": True, "comment": "race",
+            "status": "IN_PROGRESS", "current_approver_index": index}
+    calls = [("/requests/review", item["reviewer_id"])]
+    for n, admin_id in enumerate(admins):
+        calls.append(("/admin/requests/stage-approve" if n % 2 else "/requests/review", admin_id))
+    return [lambda c, path=path, user_id=user_id: c.post(path, json=body, headers=suite._headers(user_id)) for path, user_id in calls]
+
+async def _run(args):
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    counter = suite.QueryCounter()
+    app = suite._bind_app(args.url, args.async_url, counter)
+    # Earlier runs may have reviewed some of them already.
+    state = _snapshot([item["request_id"] for item in manifest["pending_reviews"]])
+    pending = [item for item in manifest["pending_reviews"] if _awaits(state[item["request_id"]], item["reviewer_id"])]
+    if len(pending) <= args.requests:
+        raise SystemExit("the manifest has too few pending reviews left; seed again")
+    raced, solo = pending[:args.requests], pending[args.requests]
+    admins = manifest["admin_ids"][:args.admins]
+    before = {item["request_id"]: state[item["request_id"]] for item in raced}
+
+    failures = []
+    statuses = {}
+    successes = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120) as client:
+        for item in raced:
+            responses = await asyncio.gather(*(call(client) for call in _contenders(item, admins, before[item["request_id"]]["index"])))
+            codes = sorted(r.status_code for r in responses)
+            for code in codes:
+                statuses[code] = statuses.get(code, 0) + 1
+            successes[item["request_id"]] = codes.count(200)
+            if not successes[item["request_id"]]:
+                failures.append({"request_id": item["request_id"], "problem": "no success", "status_codes": codes})
+        start = counter.count
+        response = await client.post("/requests/review", json={"request_id": solo["request_id"], "approved": True},
+                                     headers=suite._headers(solo["reviewer_id"]))
+        solo_statements = counter.count - start
+        if response.status_code != 200:
+            failures.append({"request_id": solo["request_id"], "problem": "uncontended", "status_codes": [response.status_code]})
+
+    after = _snapshot(list(before))
+    for request_id, old in before.items():
+        new = after[request_id]
+        advanced = new["index"] - old["index"]
+        added = new["actions"] - old["actions"]
+        if not successes[request_id] == advanced == added == 1:
+            failures.append({"request_id": request_id, "successes": successes[request_id], "stages_advanced": advanced, "actions_added": added})
+    return {
+        "raced_requests": len(raced),
+        "contenders_per_request": 1 + len(admins),
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        "stages_advanced": sum(successes.values()),
+        "statements_per_uncontended_approval": solo_statements,
+        "failures": failures,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--async-url", required=True)
+    parser.add_argument("--manifest", default="bench_manifest.json")
+    parser.add_argument("--requests", type=int, default=50, help="pending reviews to race on")
+    parser.add_argument("--admins", type=int, default=4, help="admins racing the approver")
+    args = parser.parse_args()
+    report = asyncio.run(_run(args))
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["failures"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Handler throughput with blocking vs async database access.
+
+Runs CLIENTS concurrent coroutines, each issuing QUERIES statements the way an
+async handler would: once through the sync SessionLocal (blocks the event
+loop) and once through AsyncSessionLocal (yields while Postgres works). Every
+statement sleeps server-side for --latency-ms to stand in for a slow round
+trip.
+
+    python -m benchmarks.db_concurrency --clients 1 4 16 64
+
+Any reachable Postgres works; point POSTGRES_* at a local instance. For a
+SQLite stand-in pass --url sqlite:///bench.db --async-url
+sqlite+aiosqlite:///bench.db --sql "SELECT 1".
+"""
+import argparse
+import asyncio
+import json
+import time
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from config import DATABASE_URL, ASYNC_DATABASE_URL
+
+async def _blocking_client(engine, sql, queries):
+    for _ in range(queries):
+        with engine.connect() as conn:
+            conn.execute(sql)
+
+async def _async_client(engine, sql, queries):
+    for _ in range(queries):
+        async with engine.connect() as conn:
+            await conn.execute(sql)
+
+async def _measure(client, engine, sql, clients, queries):
+    start = time.perf_counter()
+    await asyncio.gather(*(client(engine, sql, queries) for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    return round(clients * queries / elapsed, 1)
+
+async def _run(args):
+    sql = text(args.sql or f"SELECT pg_sleep({args.latency_ms / 1000})")
+    pool_size = max(args.clients)
+    sync_engine = create_engine(args.url, pool_size=pool_size, max_overflow=0)
+    async_engine = create_async_engine(args.async_url, pool_size=pool_size, max_overflow=0)
+    results = []
+    try:
+        for clients in args.clients:
+            results.append({
+                "clients": clients,
+                "blocking_qps": await _measure(_blocking_client, sync_engine, sql, clients, args.queries),
+                "async_qps": await _measure(_async_client, async_engine, sql, clients, args.queries),
+            })
+    finally:
+        sync_engine.dispose()
+        await async_engine.dispose()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--url", default=DATABASE_URL)
+    parser.add_argument("--async-url", default=ASYNC_DATABASE_URL)
+    parser.add_argument("--sql", help="statement to run instead of pg_sleep")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(_run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Check that the SQL issued by the hot routes is index-backed.
+
+Replays a few requests of every benchmarks.suite scenario in-process against
+a database filled by benchmarks.seed, captures each distinct statement with
+its parameters, and runs EXPLAIN on it. A sequential scan that filters a
+table holding at least --min-rows rows is reported as a violation; scans
+without a filter (deliberate full reads such as /admin/all-requests) and
+scans of small tables are not. Exits with status 1 when anything is
+reported.
+
+    pip install -r benchmarks/requirements.txt  # httpx
+    python -m benchmarks.explain_routes --url $URL --async-url $ASYNC_URL
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import httpx
+from sqlalchemy import event, text
+
+from benchmarks import suite
+
+def _capture(sync_engine, kind, captured):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            captured.setdefault((kind, statement), parameters)
+
+def _seq_scans(plan):
+    if plan.get("Node Type") == "Seq Scan" and "Filter" in plan:
+        yield plan["Relation Name"], plan["Filter"]
+    for child in plan.get("Plans", ()):
+        yield from _seq_scans(child)
+
+async def _explain(kind, statement, parameters):
+    import database
+    prefix = "EXPLAIN (FORMAT JSON) "
+    if kind == "async":
+        async with database.async_engine.connect() as conn:
+            result = await conn.exec_driver_sql(prefix + statement, parameters)
+            plan = result.scalar()
+    else:
+        with database.engine.connect() as conn:
+            plan = conn.exec_driver_sql(prefix + statement, parameters).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+async def _table_sizes():
+    import database
+    async with database.async_engine.connect() as conn:
+        rows = await conn.execute(text("SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'"))
+        return {name: tuples for name, tuples in rows}
+
+async def _run(args):
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    app = suite._bind_app(args.url, args.async_url, suite.QueryCounter())
+    import database
+    captured = {}
+    _capture(database.engine, "sync", captured)
+    _capture(database.async_engine.sync_engine, "async", captured)
+
+    args.page_size, args.upload_kb, args.seed = 50, 16, 1
+    rng = random.Random(args.seed)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120) as client:
+        for name in suite.SCENARIOS:
+            operations = suite._operations(name, manifest, rng, args)
+            for _ in range(args.requests):
+                operation = next(operations, None)
+                if operation is None:
+                    break
+                await operation(client)
+
+    sizes = await _table_sizes()
+    violations = []
+    for (kind, statement), parameters in captured.items():
+        plan = await _explain(kind, statement, parameters)
+        for table, condition in _seq_scans(plan):
+            if sizes.get(table, 0) >= args.min_rows:
+                violations.append({"table": table, "filter": condition, "rows": int(sizes[table]), "statement": statement})
+    return {"statements": len(captured), "violations": violations}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--async-url", required=True)
+    parser.add_argument("--manifest", default="bench_manifest.json")
+    parser.add_argument("--requests", type=int, default=3, help="requests replayed per scenario")
+    parser.add_argument("--min-rows", type=int, default=1000, help="ignore sequential scans of smaller tables")
+    args = parser.parse_args()
+    report = asyncio.run(_run(args))
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["violations"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Login throughput and API latency during a login flood.
+
+Starts LOGIN_CLIENTS clients posting /login in a loop while PROBE_CLIENTS
+clients call GET /users/me with an already issued token. Reports successful
+logins/sec, 503 rejections, and p50/p99 latency of the probe requests, which
+should stay flat when bcrypt runs outside the request threadpool.
+
+    pip install -r benchmarks/requirements.txt  # httpx
+    uvicorn main:app --workers 1 &
+    python -m benchmarks.login_flood --username alice --password secret
+
+Run it against a server whose database has the given user; compare
+BCRYPT_WORKERS=0 (threadpool) with the default process pool.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import httpx
+
+def _percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(int(len(ordered) * q), len(ordered) - 1)] * 1000, 1)
+
+async def _login(client, args):
+    return await client.post("/login", data={"username": args.username, "password": args.password})
+
+async def _flood(client, args, deadline, counts):
+    while time.perf_counter() < deadline:
+        response = await _login(client, args)
+        counts[response.status_code] = counts.get(response.status_code, 0) + 1
+        if response.status_code == 503:
+            await asyncio.sleep(float(response.headers.get("Retry-After", "1")) / 10)
+
+async def _probe(client, headers, deadline, latencies):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get("/users/me", headers=headers)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+
+async def _run(args):
+    limits = httpx.Limits(max_connections=args.login_clients + args.probe_clients + 1)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        token = (await _login(client, args)).raise_for_status().json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        baseline = []
+        await _probe(client, headers, time.perf_counter() + min(args.seconds, 5), baseline)
+
+        counts, latencies = {}, []
+        deadline = time.perf_counter() + args.seconds
+        await asyncio.gather(
+            *(_flood(client, args, deadline, counts) for _ in range(args.login_clients)),
+            *(_probe(client, headers, deadline, latencies) for _ in range(args.probe_clients)),
+        )
+    return {
+        "login_clients": args.login_clients,
+        "seconds": args.seconds,
+        "logins_per_sec": round(counts.get(200, 0) / args.seconds, 1),
+        "status_counts": counts,
+        "probe_idle_p50_ms": _percentile(baseline, 0.5),
+        "probe_p50_ms": _percentile(latencies, 0.5),
+        "probe_p99_ms": _percentile(latencies, 0.99),
+        "probe_mean_ms": round(statistics.fmean(latencies) * 1000, 1) if latencies else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--login-clients", type=int, default=64)
+    parser.add_argument("--probe-clients", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=20)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(_run(args)), indent=2))
+
+if __name__ == "__main__":
+    main()
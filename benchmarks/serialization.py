@@ -0,0 +1,79 @@
+"""Cost of encoding request payloads: response_model versus the trusted path.
+
+Builds --requests synthetic requests (no database) with approvers and
+approver actions, hydrates them with utils._build_request_response, then
+times the two ways a route can send the result: validating and dumping it
+through the response schema as response_model does, and encoding the dicts
+directly with serialization.dumps. Both must produce the same bytes.
+
+    python -m benchmarks.serialization --requests 10000
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import List
+from pydantic import TypeAdapter
+
+import models, schemas, serialization, utils
+
+def _fixture(n: int):
+    rng = random.Random(0)
+    users = {i: SimpleNamespace(id=i, name=f"User {i}") for i in range(1, 201)}
+    now = datetime(2026, 1, 1)
+    rows = []
+    for i in range(1, n + 1):
+        approvers = rng.sample(range(1, 201), 3)
+        index = rng.randint(0, 3)
+        req = models.Request(
+            id=i, initiator_id=rng.randint(1, 200), supervisor_id=rng.randint(1, 200),
+            subject=f"NFA {i}", description="vendor supply " * 20, area="North", project="Tower A",
+            tower="T1", department="Finance", references="PO-1234", priority="High",
+            approvers=approvers, current_approver_index=index, status="IN_PROGRESS" if index < 3 else "APPROVED",
+            created_at=now, updated_at=now + timedelta(minutes=i), last_action="Approved",
+            supervisor_approved_at=now, files=[{"url": f"nfa_files/{i}.pdf", "name": f"{i}.pdf"}],
+        )
+        stamp = now.replace(tzinfo=timezone.utc)
+        actions = [
+            models.ApproverAction(request_id=i, approver_id=a, approved="APPROVED", received_at=stamp,
+                                  action_time=stamp, comment="ok", approved_by=None)
+            for a in approvers[:index]
+        ]
+        rows.append((req, actions))
+    return users, rows
+
+def _time(fn, runs: int):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return result, round(statistics.median(samples) * 1000, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    users, rows = _fixture(args.requests)
+    adapter = TypeAdapter(List[schemas.RequestResponse])
+
+    payload, build_ms = _time(lambda: [utils._build_request_response(req, users, actions) for req, actions in rows], args.runs)
+    validated, validated_ms = _time(lambda: adapter.dump_json(adapter.validate_python(payload, from_attributes=True)), args.runs)
+    trusted, trusted_ms = _time(lambda: serialization.dumps(payload), args.runs)
+    if validated != trusted:
+        raise SystemExit("the trusted encoding differs from the response_model output")
+    print(json.dumps({
+        "requests": args.requests,
+        "bytes": len(trusted),
+        "build_ms": build_ms,
+        "response_model_encode_ms": validated_ms,
+        "trusted_encode_ms": trusted_ms,
+        "speedup": round(validated_ms / trusted_ms, 1),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
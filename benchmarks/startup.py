@@ -0,0 +1,89 @@
+"""Cold-start time: process launch to first successful response.
+
+Starts `uvicorn main:app` RUNS times and polls GET / until it answers 200,
+reporting the time from process launch to that first response. It also
+times `import main` alone and the first PDF render, which pays the deferred
+reportlab import. The server inherits the environment, so point it at a
+reachable database and set AUTO_CREATE_SCHEMA/DB_POOL_WARMUP to
+compare configurations.
+
+    pip install -r benchmarks/requirements.txt  # httpx
+    AUTO_CREATE_SCHEMA=1 python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+RENDER_SNIPPET = """
+import time
+from datetime import datetime
+from types import SimpleNamespace
+import utils
+req = SimpleNamespace(id=1, subject="s", description="d", area="a", project="p", tower="t", department="d",
+                      references="r", priority="Low", status="APPROVED", created_at=datetime.utcnow(),
+                      updated_at=datetime.utcnow(), approvers=[], supervisor_approved_at=None)
+t = time.perf_counter()
+utils.render_pdf(req, "initiator", "supervisor")
+print(time.perf_counter() - t)
+"""
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _time_snippet(snippet: str):
+    output = subprocess.run([sys.executable, "-c", snippet], capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+def _first_response(timeout: float):
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"server exited with status {server.returncode}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError("server did not answer within the timeout")
+    finally:
+        server.terminate()
+        server.wait()
+
+def _summary(samples):
+    return {
+        "min_ms": round(min(samples) * 1000, 1),
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+    results = {
+        "auto_create_schema": os.getenv("AUTO_CREATE_SCHEMA", "false"),
+        "import_main": _summary([_time_snippet(IMPORT_SNIPPET) for _ in range(args.runs)]),
+        "first_pdf_render": _summary([_time_snippet(RENDER_SNIPPET) for _ in range(args.runs)]),
+        "launch_to_first_response": _summary([_first_response(args.timeout) for _ in range(args.runs)]),
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""End-to-end benchmark of the API hot paths.
+
+Drives the real app through GET /requests/, /admin/all-requests,
+/requests/review, /requests/{id}/pdf, /upload-file/{id} and /login against a
+database filled by benchmarks.seed, and prints one JSON document with
+throughput, p50/p95/p99 latency and, in-process, SQL statements per request.
+
+    pip install -r benchmarks/requirements.txt  # httpx
+    python -m benchmarks.seed --url $URL --reset --requests 20000
+    python -m benchmarks.suite --url $URL --async-url $ASYNC_URL > before.json
+
+The app runs in-process over httpx's ASGI transport by default; pass
+--server http://127.0.0.1:8000 to measure a uvicorn started against the same
+database instead (queries per request are then not reported). Keep --seed,
+volumes and --concurrency fixed when comparing two releases.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+import httpx
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine
+
+SCENARIOS = ("list_requests", "admin_all_requests", "review", "pdf", "upload", "login")
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def attach(self, sync_engine):
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def _count(*args):
+            self.count += 1
+
+def _bind_app(url: str, async_url: str, counter: QueryCounter):
+    # Point the app's engines at the benchmark database before main is imported.
+    import database
+    database.engine = create_engine(url)
+    database.SessionLocal.configure(bind=database.engine)
+    database.async_engine = create_async_engine(async_url)
+    database.AsyncSessionLocal.configure(bind=database.async_engine)
+    counter.attach(database.engine)
+    counter.attach(database.async_engine.sync_engine)
+    import main
+    return main.app
+
+def _percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(int(len(ordered) * q), len(ordered) - 1)] * 1000, 2)
+
+@functools.lru_cache(maxsize=None)
+def _headers(user_id):
+    import auth
+    return {"Authorization": f"Bearer {auth.create_access_token({'sub': str(user_id)})}"}
+
+def _operations(name, manifest, rng, args):
+    """Yield zero-argument callables, each issuing one request of the scenario."""
+    users = manifest["user_ids"]
+    admins = manifest["admin_ids"]
+    if name == "list_requests":
+        while True:
+            headers = _headers(rng.choice(users))
+            yield lambda c, h=headers: c.get("/requests/", params={"limit": args.page_size}, headers=h)
+    elif name == "admin_all_requests":
+        headers = _headers(admins[0])
+        while True:
+            yield lambda c: c.get("/admin/all-requests", headers=headers)
+    elif name == "review":
+        for item in manifest["pending_reviews"]:
+            body = {"request_id": item["request_id"], "approved": True, "comment": "benchmark"}
+            yield lambda c, b=body, h=_headers(item["reviewer_id"]): c.post("/requests/review", json=b, headers=h)
+    elif name == "pdf":
+        approved = manifest["approved_requests"]
+        while approved:
+            item = rng.choice(approved)
+            yield lambda c, i=item, h=_headers(item["initiator_id"]): c.get(f"/requests/{i['request_id']}/pdf", headers=h)
+    elif name == "upload":
+        payload = os.urandom(args.upload_kb * 1024)
+        approved = manifest["approved_requests"]
+        while approved:
+            item = rng.choice(approved)
+            yield lambda c, i=item, h=_headers(item["initiator_id"]): c.post(
+                f"/upload-file/{i['request_id']}", files={"files": ("bench.bin", payload)}, headers=h)
+    elif name == "login":
+        usernames = list(manifest["usernames"].values())
+        while True:
+            data = {"username": rng.choice(usernames), "password": manifest["password"]}
+            yield lambda c, d=data: c.post("/login", data=d)
+
+async def _scenario(client, name, manifest, args, counter):
+    rng = random.Random(args.seed)
+    operations = _operations(name, manifest, rng, args)
+    latencies, errors = [], 0
+    remaining = args.requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            operation = next(operations, None)
+            if operation is None:
+                return
+            remaining -= 1
+            start = time.perf_counter()
+            response = await operation(client)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    queries_before = counter.count if counter else None
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+    done = len(latencies)
+    return {
+        "requests": done,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(done / elapsed, 1) if elapsed else None,
+        "p50_ms": _percentile(latencies, 0.50),
+        "p95_ms": _percentile(latencies, 0.95),
+        "p99_ms": _percentile(latencies, 0.99),
+        "queries_per_request": round((counter.count - queries_before) / done, 2) if counter and done else None,
+    }
+
+def _revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def _run(args):
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    counter = None
+    if args.server:
+        transport, base_url = None, args.server
+    else:
+        counter = QueryCounter()
+        transport, base_url = httpx.ASGITransport(app=_bind_app(args.url, args.async_url, counter)), "http://bench"
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=120) as client:
+        for name in args.scenarios:
+            results[name] = await _scenario(client, name, manifest, args, counter)
+            print(f"{name}: {results[name]}", file=sys.stderr)
+    return {
+        "meta": {
+            "revision": _revision(),
+            "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "mode": "server" if args.server else "in-process",
+            "concurrency": args.concurrency,
+            "requests_per_scenario": args.requests,
+            "seed": args.seed,
+            "data": manifest["counts"],
+        },
+        "scenarios": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="sync SQLAlchemy URL of the seeded database (in-process mode)")
+    parser.add_argument("--async-url", help="async SQLAlchemy URL of the same database (in-process mode)")
+    parser.add_argument("--server", help="base URL of a running server instead of in-process")
+    parser.add_argument("--manifest", default="bench_manifest.json")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--upload-kb", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON here")
+    args = parser.parse_args()
+    if not args.server and not (args.url and args.async_url):
+        parser.error("in-process mode needs --url and --async-url")
+    report = json.dumps(asyncio.run(_run(args)), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    print(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Memory and event-loop impact of concurrent attachment uploads.
+
+Compares the old read-everything-then-write handling with the chunked
+hash-then-write path of uploads.py for N concurrent uploads of SIZE_MB each.
+Reports peak Python heap growth (tracemalloc) and the worst event-loop stall
+seen by a 10 ms ticker.
+
+    python -m benchmarks.upload_memory --clients 8 --size-mb 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+import uploads, utils
+
+def _make_upload(path: str, name: str):
+    return UploadFile(file=open(path, "rb"), filename=name, size=os.path.getsize(path))
+
+async def _naive(file: UploadFile, relative_path: str):
+    file.file.seek(0)
+    content = await file.read()
+    with open(os.path.join(utils.UPLOAD_FOLDER, relative_path), "wb") as f:
+        f.write(content)
+
+async def _streaming(file: UploadFile, relative_path: str):
+    await run_in_threadpool(uploads.hash_upload, file)
+    await run_in_threadpool(uploads.write_blob, file, relative_path)
+
+async def _ticker(stop: asyncio.Event, lags: list):
+    interval = 0.01
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+async def _run(strategy, source: str, clients: int):
+    files = [_make_upload(source, f"drawing_{i}.pdf") for i in range(clients)]
+    stop, lags = asyncio.Event(), []
+    ticker = asyncio.create_task(_ticker(stop, lags))
+    tracemalloc.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(strategy(f, f"bench_{i}.pdf") for i, f in enumerate(files)))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stop.set()
+    await ticker
+    for f in files:
+        f.file.close()
+    return {
+        "seconds": round(elapsed, 3),
+        "peak_heap_mb": round(peak / 2 ** 20, 1),
+        "max_loop_stall_ms": round(max(lags, default=0) * 1000, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--size-mb", type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="nfa-upload-bench-")
+    utils.UPLOAD_FOLDER = workdir
+    source = os.path.join(workdir, "source.bin")
+    with open(source, "wb") as f:
+        for _ in range(args.size_mb):
+            f.write(os.urandom(2 ** 20))
+    try:
+        results = {
+            "clients": args.clients,
+            "size_mb": args.size_mb,
+            "read_all": asyncio.run(_run(_naive, source, args.clients)),
+            "streaming": asyncio.run(_run(_streaming, source, args.clients)),
+        }
+    finally:
+        shutil.rmtree(workdir)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
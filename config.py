@@ -7,10 +7,78 @@ POSTGRES_DB = os.getenv("POSTGRES_DB", "database")
 POSTGRES_HOST = '18.136.101.34'
 POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
 DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+
+# Schema changes go through `alembic upgrade head`. Local development may set
+# AUTO_CREATE_SCHEMA=1 to have missing tables created at startup instead.
+AUTO_CREATE_SCHEMA = os.getenv("AUTO_CREATE_SCHEMA", "false").lower() in ("1", "true", "yes")
+
+# Connection pool tuning, shared by the sync and async engines.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Connections opened per pool at startup, before the first request arrives.
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", str(DB_POOL_SIZE)))
+# Server-side statement_timeout in milliseconds; 0 disables it.
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
 
 SECRET_KEY = os.getenv("SECRET_KEY", "my-secret-key")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# Password hashing. BCRYPT_ROUNDS is the bcrypt cost; stored hashes at another
+# cost are upgraded on the user's next login. Hashing runs in BCRYPT_WORKERS
+# processes (0 runs it in the threadpool) with at most BCRYPT_MAX_QUEUE jobs
+# waiting before requests are rejected with 503.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(max((os.cpu_count() or 2) // 2, 1))))
+BCRYPT_MAX_QUEUE = int(os.getenv("BCRYPT_MAX_QUEUE", "64"))
+BCRYPT_RETRY_AFTER_SECONDS = int(os.getenv("BCRYPT_RETRY_AFTER_SECONDS", "1"))
+
+# Expired rows in the tokens table are deleted this often, at most
+# TOKEN_SWEEP_BATCH_SIZE per statement; an interval of 0 disables the sweeper.
+TOKEN_SWEEP_INTERVAL_SECONDS = float(os.getenv("TOKEN_SWEEP_INTERVAL_SECONDS", "300"))
+TOKEN_SWEEP_BATCH_SIZE = int(os.getenv("TOKEN_SWEEP_BATCH_SIZE", "1000"))
+
+# Verified token -> user snapshots are cached in-process for at most this long
+# (and never past the token's exp); 0 disables the cache.
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+
+# Serialised GET /requests/ and /admin/all-requests bodies are cached in-process
+# under their ETag for this long; 0 disables the cache (ETags and 304s remain).
+LIST_CACHE_TTL_SECONDS = float(os.getenv("LIST_CACHE_TTL_SECONDS", "0"))
+LIST_CACHE_MAX_ENTRIES = int(os.getenv("LIST_CACHE_MAX_ENTRIES", "256"))
+
+# Attachment uploads are streamed to disk in chunks of this size; 0 disables the limit.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Rendered PDFs of approved NFAs are cached on disk up to this many bytes.
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "pdf_cache")
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Rows fetched and hydrated per round trip by GET /admin/requests/export.
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+
+# Most actions accepted by one POST /requests/review/bulk call.
+BULK_REVIEW_MAX_ITEMS = int(os.getenv("BULK_REVIEW_MAX_ITEMS", "500"))
+
+# Serve admin request counts from the incrementally maintained request_counters
+# table instead of COUNT(*) over requests.
+REQUEST_COUNTERS_ENABLED = os.getenv("REQUEST_COUNTERS_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Per-route request and SQL metrics, served at /metrics. DEBUG also reports
+# each response's SQL statement count and DB time in X-Query-Count and
+# X-DB-Time-ms headers.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+DEBUG = os.getenv("DEBUG", "false").lower() in ("1", "true", "yes")
+
+# What a route or block that exceeds its declared SQL budget does (see
+# query_budget.py): "off", "log" (staging) or "raise" (tests).
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "off").lower()
+
 # IST offset in seconds (5h 30m)
 IST_OFFSET = 5 * 3600 + 30 * 60
@@ -0,0 +1,97 @@
+from collections import Counter
+from sqlalchemy import event, func, inspect, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+import models
+
+# request_counters holds one row per (initiator_id, status) with the number of
+# requests in that state. It is kept in step with requests by a flush hook, so
+# every create/review/withdraw adjusts it inside the same transaction. The hook
+# runs whether or not REQUEST_COUNTERS_ENABLED is set (the flag only chooses
+# where counts are read from), so switching the flag never serves stale counts.
+
+def previous_value(obj, attr):
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(obj, attr)
+
+def _collect_deltas(session: Session):
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, models.Request):
+            deltas[(obj.initiator_id, obj.status or "NEW")] += 1
+    for obj in session.deleted:
+        if isinstance(obj, models.Request):
+            deltas[(previous_value(obj, "initiator_id"), previous_value(obj, "status"))] -= 1
+    for obj in session.dirty:
+        if not isinstance(obj, models.Request):
+            continue
+        state = inspect(obj)
+        if not (state.attrs.status.history.has_changes() or state.attrs.initiator_id.history.has_changes()):
+            continue
+        deltas[(previous_value(obj, "initiator_id"), previous_value(obj, "status"))] -= 1
+        deltas[(obj.initiator_id, obj.status)] += 1
+    return {key: delta for key, delta in deltas.items() if delta}
+
+@event.listens_for(Session, "after_flush")
+def _apply_request_counter_deltas(session, flush_context):
+    deltas = _collect_deltas(session)
+    if not deltas:
+        return
+    table = models.RequestCounter.__table__
+    # One multi-row upsert per flush, however many requests it touched.
+    stmt = insert(table).values([
+        {"initiator_id": initiator_id, "status": status, "count": delta}
+        for (initiator_id, status), delta in deltas.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.initiator_id, table.c.status],
+        set_={"count": table.c.count + stmt.excluded.count}
+    )
+    session.connection().execute(stmt)
+
+def _expected():
+    r = models.Request
+    status = func.coalesce(r.status, "NEW")
+    return select(r.initiator_id, status, func.count(r.id)).group_by(r.initiator_id, status)
+
+def _lock(db: Session):
+    # Block writers on requests while the snapshot is taken so no delta is
+    # lost, and other rebuilds until this one commits.
+    db.execute(text("LOCK TABLE requests IN SHARE MODE"))
+    db.execute(text("LOCK TABLE request_counters IN EXCLUSIVE MODE"))
+
+def _fill(db: Session):
+    table = models.RequestCounter.__table__
+    db.execute(table.delete())
+    db.execute(table.insert().from_select(["initiator_id", "status", "count"], _expected()))
+
+def rebuild(db: Session):
+    _lock(db)
+    _fill(db)
+    db.commit()
+
+def check(db: Session):
+    """Compare request_counters with counts taken from requests."""
+    table = models.RequestCounter.__table__
+    expected = _expected()
+    actual = select(table.c.initiator_id, table.c.status, table.c.count).where(table.c.count != 0)
+    missing = db.execute(expected.except_(actual)).all()
+    unexpected = db.execute(actual.except_(expected)).all()
+    return {
+        "consistent": not (missing or unexpected),
+        "missing": [{"initiator_id": i, "status": s, "count": c} for i, s, c in missing],
+        "unexpected": [{"initiator_id": i, "status": s, "count": c} for i, s, c in unexpected],
+    }
+
+def ensure_seeded(db: Session):
+    # For a table create_all has just added; migration 0008 seeds it otherwise.
+    # Emptiness is re-checked under the lock, so concurrently starting workers
+    # fill it once.
+    _lock(db)
+    if db.query(models.RequestCounter).first() is None:
+        _fill(db)
+    db.commit()
@@ -1,6 +1,13 @@
+from sqlalchemy import and_, func, literal, or_, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 import models, schemas
-from datetime import datetime
+from datetime import datetime, timezone
+from config import REQUEST_COUNTERS_ENABLED
+
+# Write functions flush but never commit: the route handler commits once, so
+# everything an HTTP request writes lands in a single transaction. Generated
+# keys come back through the INSERT's RETURNING, so nothing is re-selected.
 
 def create_user(db: Session, user: schemas.UserCreate, hashed_password: str):
     db_user = models.User(
@@ -11,8 +18,7 @@ def create_user(db: Session, user: schemas.UserCreate, hashed_password: str):
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    db.flush()
     return db_user
 
 def get_user_by_username(db: Session, username: str):
@@ -21,82 +27,272 @@ def get_user_by_username(db: Session, username: str):
 def get_user_by_id(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.id == user_id).first()
 
+def get_users_by_ids(db: Session, user_ids):
+    user_ids = set(user_ids)
+    if not user_ids:
+        return []
+    return db.query(models.User).filter(models.User.id.in_(user_ids)).all()
+
 def list_all_users(db: Session):
     return db.query(models.User).all()
 
+def list_user_ids(db: Session):
+    return [user_id for (user_id,) in db.query(models.User.id).all()]
+
 def update_user(db: Session, user: models.User):
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    db.flush()
     return user
 
 def create_request(db: Session, request_data: dict):
     db_request = models.Request(**request_data)
     db.add(db_request)
-    db.commit()
-    db.refresh(db_request)
+    db.flush()
     return db_request
 
 def get_request_by_id(db: Session, request_id: int):
     return db.query(models.Request).filter(models.Request.id == request_id).first()
 
+def get_requests_for_update(db: Session, request_ids):
+    # Row locks are taken in id order so concurrent batches cannot deadlock.
+    request_ids = set(request_ids)
+    if not request_ids:
+        return []
+    return db.query(models.Request).filter(models.Request.id.in_(request_ids)).order_by(
+        models.Request.id
+    ).with_for_update().all()
+
 def update_request(db: Session, request_obj: models.Request):
     db.add(request_obj)
-    db.commit()
-    db.refresh(request_obj)
+    db.flush()
     return request_obj
 
 def list_all_requests(db: Session):
     return db.query(models.Request).all()
 
-def create_approver_action(db: Session, action_data: dict):
-    db_action = models.ApproverAction(**action_data)
-    db.add(db_action)
-    db.commit()
-    db.refresh(db_action)
-    return db_action
+def iter_requests(db: Session, chunk_size: int):
+    # Streamed through a server-side cursor, chunk_size rows per fetch.
+    return db.query(models.Request).order_by(models.Request.id).yield_per(chunk_size)
+
+def count_requests(db: Session, statuses=None):
+    if REQUEST_COUNTERS_ENABLED:
+        query = db.query(func.coalesce(func.sum(models.RequestCounter.count), 0))
+        if statuses:
+            query = query.filter(models.RequestCounter.status.in_(statuses))
+        return query.scalar()
+    query = db.query(func.count(models.Request.id))
+    if statuses:
+        query = query.filter(models.Request.status.in_(statuses))
+    return query.scalar()
+
+def count_requests_by_initiator(db: Session, statuses=None):
+    if REQUEST_COUNTERS_ENABLED:
+        query = db.query(models.RequestCounter.initiator_id, func.sum(models.RequestCounter.count))
+        if statuses:
+            query = query.filter(models.RequestCounter.status.in_(statuses))
+        query = query.group_by(models.RequestCounter.initiator_id)
+    else:
+        query = db.query(models.Request.initiator_id, func.count(models.Request.id))
+        if statuses:
+            query = query.filter(models.Request.status.in_(statuses))
+        query = query.group_by(models.Request.initiator_id)
+    return {initiator_id: int(count) for initiator_id, count in query.all()}
+
+def request_visible_to(user_id: int):
+    # A request is visible to its initiator and supervisor, to every approver
+    # once it is closed, and to the approver whose stage is currently pending.
+    # Postgres arrays are 1-based, hence the +1 on current_approver_index.
+    return or_(
+        models.Request.initiator_id == user_id,
+        models.Request.supervisor_id == user_id,
+        and_(
+            models.Request.status.in_(("APPROVED", "REJECTED")),
+            models.Request.approvers.contains([user_id])
+        ),
+        and_(
+            models.Request.status == "IN_PROGRESS",
+            models.Request.approvers[models.Request.current_approver_index + 1] == user_id
+        )
+    )
+
+def _escape_like(value: str):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _visible_requests(
+    db: Session,
+    user_id: int,
+    note_id: int = None,
+    created_from: datetime = None,
+    created_to: datetime = None,
+    initiator_name: str = None,
+    statuses=None,
+    after: tuple = None
+):
+    query = db.query(models.Request).filter(request_visible_to(user_id))
+    if note_id:
+        query = query.filter(models.Request.id == note_id)
+    if created_from:
+        query = query.filter(models.Request.created_at >= created_from)
+    if created_to:
+        query = query.filter(models.Request.created_at < created_to)
+    if initiator_name:
+        query = query.join(models.User, models.User.id == models.Request.initiator_id).filter(
+            models.User.name.ilike(f"%{_escape_like(initiator_name)}%", escape="\\")
+        )
+    if statuses:
+        query = query.filter(models.Request.status.in_(statuses))
+    # Keyset pagination: newest activity first, id breaks ties.
+    if after:
+        query = query.filter(tuple_(models.Request.updated_at, models.Request.id) < tuple_(*after))
+    return query
+
+def list_requests_for_user(db: Session, user_id: int, limit: int = None, **filters):
+    query = _visible_requests(db, user_id, **filters)
+    query = query.order_by(models.Request.updated_at.desc(), models.Request.id.desc())
+    if limit:
+        query = query.limit(limit)
+    return query.all()
 
-def get_approver_action(db: Session, request_id: int, approver_id: int):
+def requests_version(db: Session, user_id: int = None, **filters):
+    """(count, newest updated_at, sum of versions) over a listing's requests.
+
+    Every ORM update bumps Request.version, so the triple changes whenever a
+    request in the set is created, changed or deleted. user_id None covers
+    all requests.
+    """
+    query = db.query(models.Request) if user_id is None else _visible_requests(db, user_id, **filters)
+    return tuple(query.with_entities(
+        func.count(models.Request.id),
+        func.max(models.Request.updated_at),
+        func.coalesce(func.sum(models.Request.version), 0)
+    ).one())
+
+def search_requests(
+    db: Session,
+    user_id: int,
+    text: str = None,
+    initiator_name: str = None,
+    limit: int = 50,
+    after: tuple = None
+):
+    # Full-text match on the GIN-indexed search_vector, ranked by ts_rank_cd;
+    # rows come back as (request, rank). Keyset pagination on (rank, id).
+    rank = literal(0.0)
+    query = db.query(models.Request).filter(request_visible_to(user_id))
+    if text:
+        tsquery = func.websearch_to_tsquery("english", text)
+        rank = func.ts_rank_cd(models.Request.search_vector, tsquery)
+        query = query.filter(models.Request.search_vector.op("@@")(tsquery))
+    if initiator_name:
+        query = query.join(models.User, models.User.id == models.Request.initiator_id).filter(
+            models.User.name.ilike(f"%{_escape_like(initiator_name)}%", escape="\\")
+        )
+    if after:
+        query = query.filter(tuple_(rank, models.Request.id) < tuple_(*after))
+    return query.add_columns(rank).order_by(rank.desc(), models.Request.id.desc()).limit(limit).all()
+
+def list_pending_requests(db: Session, user_id: int, limit: int = None):
+    # Served from pending_assignments (see inbox.py), so the cost follows the
+    # number of requests waiting on this user rather than the size of requests.
+    query = db.query(models.Request).join(
+        models.PendingAssignment, models.PendingAssignment.request_id == models.Request.id
+    ).filter(models.PendingAssignment.user_id == user_id).order_by(
+        models.PendingAssignment.received_at.desc(), models.Request.id.desc()
+    )
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+def list_approver_actions_by_requests(db: Session, request_ids):
+    request_ids = set(request_ids)
+    if not request_ids:
+        return []
     return db.query(models.ApproverAction).filter(
-        models.ApproverAction.request_id == request_id,
-        models.ApproverAction.approver_id == approver_id
-    ).first()
+        models.ApproverAction.request_id.in_(request_ids)
+    ).order_by(models.ApproverAction.id).all()
 
-def list_approver_actions_by_request(db: Session, request_id: int):
-    return db.query(models.ApproverAction).filter(models.ApproverAction.request_id == request_id).all()
+def existing_approver_actions(db: Session, stages):
+    """The (request_id, approver_id) pairs in stages that already have an action."""
+    stages = set(stages)
+    if not stages:
+        return set()
+    rows = db.query(models.ApproverAction.request_id, models.ApproverAction.approver_id).filter(
+        tuple_(models.ApproverAction.request_id, models.ApproverAction.approver_id).in_(stages)
+    ).all()
+    return {tuple(row) for row in rows}
 
 def delete_approver_actions_by_request(db: Session, request_id: int):
     db.query(models.ApproverAction).filter(models.ApproverAction.request_id == request_id).delete()
-    db.commit()
+
+def lock_file_blob(db, sha256: str):
+    # Transaction-scoped lock on one digest; db is a Session or a Connection.
+    db.execute(select(func.pg_advisory_xact_lock(func.hashtext(sha256))))
+
+def file_blob_exists(db, sha256: str):
+    table = models.FileBlob.__table__
+    return db.execute(select(table.c.sha256).where(table.c.sha256 == sha256)).first() is not None
+
+def acquire_file_blob(db: Session, sha256: str, path: str, size: int):
+    # Insert the blob or take another reference on it; returns the stored path,
+    # which for an existing blob may differ from the proposed one. The digest
+    # stays locked until the caller commits, so the blob cannot be unlinked
+    # by uploads.remove_orphaned_blobs before the new reference is visible.
+    lock_file_blob(db, sha256)
+    table = models.FileBlob.__table__
+    stmt = insert(table).values(sha256=sha256, path=path, size=size, ref_count=1, created_at=datetime.utcnow())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.sha256],
+        set_={"ref_count": table.c.ref_count + 1}
+    ).returning(table.c.path)
+    return db.execute(stmt).scalar_one()
+
+def release_file_blob(db: Session, sha256: str, count: int = 1):
+    # Returns the blob path when its last reference was dropped.
+    blob = db.query(models.FileBlob).filter(models.FileBlob.sha256 == sha256).with_for_update().first()
+    if blob is None:
+        return None
+    blob.ref_count -= count
+    if blob.ref_count > 0:
+        return None
+    db.delete(blob)
+    return blob.path
 
 def create_error_log(db: Session, log_data: dict):
     db_log = models.ErrorLog(**log_data)
     db.add(db_log)
-    db.commit()
+    db.flush()
 
-def create_token(db: Session, token: str, details: dict):
+def create_token(db: Session, token_hash: str, details: dict):
     db_token = models.Token(
-        token=token,
+        token=token_hash,
         user_id=details.get("user_id"),
         created_at=details.get("created_at"),
+        expires_at=details.get("expires_at"),
         ip_address=details.get("ip_address"),
         user_agent=details.get("user_agent")
     )
     db.add(db_token)
-    db.commit()
-    db.refresh(db_token)
+    db.flush()
     return db_token
 
-def get_token_details(db: Session, token: str):
-    return db.query(models.Token).filter(models.Token.token == token).first()
+def get_token_details(db: Session, token_hash: str):
+    return db.query(models.Token).filter(models.Token.token == token_hash).first()
 
 def list_tokens_by_user(db: Session, user_id: int):
-    return db.query(models.Token).filter(models.Token.user_id == user_id).all()
+    return db.query(models.Token).filter(
+        models.Token.user_id == user_id,
+        or_(models.Token.expires_at.is_(None), models.Token.expires_at > datetime.now(timezone.utc))
+    ).all()
 
-def remove_token(db: Session, token: str):
-    db.query(models.Token).filter(models.Token.token == token).delete()
-    db.commit()
+def remove_token(db: Session, token_hash: str):
+    db.query(models.Token).filter(models.Token.token == token_hash).delete()
 
 def remove_tokens_by_user(db: Session, user_id: int):
     db.query(models.Token).filter(models.Token.user_id == user_id).delete()
-    db.commit()
+
+def delete_expired_tokens(db: Session, batch_size: int):
+    # One bounded batch per call so the sweeper never holds long locks.
+    expired_ids = db.query(models.Token.id).filter(
+        models.Token.expires_at < datetime.now(timezone.utc)
+    ).limit(batch_size).scalar_subquery()
+    return db.query(models.Token).filter(models.Token.id.in_(expired_ids)).delete(synchronize_session=False)
@@ -1,15 +1,155 @@
-from sqlalchemy import create_engine
+import asyncio
+import threading
+import time
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from config import DATABASE_URL
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
+from config import (
+    DATABASE_URL, ASYNC_DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_STATEMENT_TIMEOUT_MS
+)
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+class PoolStats:
+    """Checkout wait times and high-water marks for one engine's pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.peak_in_use = 0
+        self.peak_overflow = 0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def record_usage(self, in_use: int, overflow: int):
+        with self._lock:
+            self.peak_in_use = max(self.peak_in_use, in_use)
+            self.peak_overflow = max(self.peak_overflow, overflow)
+
+    def snapshot(self, pool):
+        with self._lock:
+            return {
+                "pool_size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "peak_in_use": self.peak_in_use,
+                "peak_overflow": self.peak_overflow,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 3),
+            }
+
+def _timed_pool(pool_class, stats: PoolStats):
+    # Pool events fire after a connection is handed out, so the time spent
+    # waiting for one is measured around the pool's own _do_get.
+    class TimedPool(pool_class):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                conn = super()._do_get()
+            except exc.TimeoutError:
+                stats.record_wait(time.perf_counter() - start, timed_out=True)
+                raise
+            stats.record_wait(time.perf_counter() - start)
+            return conn
+    return TimedPool
+
+def _pool_options(pool_class, stats: PoolStats):
+    return {
+        "poolclass": _timed_pool(pool_class, stats),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+def _track_usage(sync_engine, stats: PoolStats):
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.record_usage(sync_engine.pool.checkedout(), sync_engine.pool.overflow())
+
+sync_pool_stats = PoolStats()
+async_pool_stats = PoolStats()
+
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"},
+    **_pool_options(QueuePool, sync_pool_stats)
+)
+_track_usage(engine, sync_pool_stats)
+# Handlers commit once and then serialise what they wrote, so objects are not
+# expired (and re-selected) on commit.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 Base = declarative_base()
 
+# Async handlers use their own engine on an asyncio driver so queries never
+# block the event loop. Objects stay loaded after commit: an expired attribute
+# cannot be lazily refreshed outside a greenlet.
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args={"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}},
+    **_pool_options(AsyncAdaptedQueuePool, async_pool_stats)
+)
+_track_usage(async_engine.sync_engine, async_pool_stats)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+def pool_stats():
+    return {
+        "sync": sync_pool_stats.snapshot(engine.pool),
+        "async": async_pool_stats.snapshot(async_engine.sync_engine.pool),
+    }
+
+def _warm_sync_connection(barrier: threading.Barrier):
+    with engine.connect() as conn:
+        conn.exec_driver_sql("SELECT 1")
+        # Hold the connection until the others are open so each is a new one.
+        try:
+            barrier.wait(timeout=10)
+        except threading.BrokenBarrierError:
+            pass
+
+async def _warm_async_connection(opened: asyncio.Event, remaining: list):
+    async with async_engine.connect() as conn:
+        await conn.exec_driver_sql("SELECT 1")
+        remaining[0] -= 1
+        if remaining[0] == 0:
+            opened.set()
+        try:
+            await asyncio.wait_for(opened.wait(), timeout=10)
+        except asyncio.TimeoutError:
+            pass
+
+async def warm_up_pools(connections: int):
+    """Open `connections` connections in each pool concurrently."""
+    if connections <= 0:
+        return
+    barrier = threading.Barrier(connections)
+    opened, remaining = asyncio.Event(), [connections]
+    await asyncio.gather(
+        *(run_in_threadpool(_warm_sync_connection, barrier) for _ in range(connections)),
+        *(_warm_async_connection(opened, remaining) for _ in range(connections)),
+    )
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,35 @@
+import csv
+import io
+import json
+from itertools import islice
+import crud, database, schemas, serialization, utils
+from config import EXPORT_CHUNK_SIZE
+
+# Full request exports for reporting. Rows come off a server-side cursor and
+# are hydrated and encoded one chunk at a time, so memory stays flat however
+# many requests there are. The generators open their own session: the route's
+# session is closed before the response body is streamed.
+
+CSV_FIELDS = list(schemas.RequestResponse.model_fields)
+
+def _chunks(chunk_size: int):
+    with database.SessionLocal() as db:
+        rows = iter(crud.iter_requests(db, chunk_size))
+        while chunk := list(islice(rows, chunk_size)):
+            yield utils.to_request_responses(db, chunk)
+
+def ndjson_lines(chunk_size: int = EXPORT_CHUNK_SIZE):
+    for chunk in _chunks(chunk_size):
+        yield b"".join(serialization.dumps(item) + b"\n" for item in chunk)
+
+def csv_lines(chunk_size: int = EXPORT_CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    for chunk in _chunks(chunk_size):
+        for item in chunk:
+            # List-valued columns are written as JSON.
+            writer.writerow({k: json.dumps(v) if isinstance(v, (list, dict)) else v for k, v in item.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
@@ -0,0 +1,105 @@
+from datetime import datetime
+from sqlalchemy import and_, case, event, func, or_, select, text
+from sqlalchemy.orm import Session
+import models
+from counters import previous_value
+
+# pending_assignments holds, for every request that is waiting on someone, the
+# user it is waiting on: the supervisor while the request is NEW, then the
+# approver at current_approver_index. A flush hook keeps it in step with
+# requests inside the same transaction, so "pending on me" is an index range
+# scan on (user_id, received_at) instead of a filter over every request.
+
+def assignment(status, supervisor_id, approvers, approver_index):
+    """(user_id, stage) the request is waiting on, or None once nobody is."""
+    if status == "NEW":
+        return supervisor_id, 0
+    approver_index = approver_index or 0
+    if status == "IN_PROGRESS" and approver_index < len(approvers or ()):
+        return approvers[approver_index], approver_index + 1
+    return None
+
+def _current(req):
+    return assignment(req.status or "NEW", req.supervisor_id, req.approvers, req.current_approver_index)
+
+def _before(req):
+    return assignment(*(previous_value(req, attr) for attr in ("status", "supervisor_id", "approvers", "current_approver_index")))
+
+@event.listens_for(Session, "after_flush")
+def _sync_pending_assignments(session, flush_context):
+    stale, fresh = [], []
+    for obj in session.new:
+        if isinstance(obj, models.Request):
+            fresh.append((obj, _current(obj)))
+    for obj in session.deleted:
+        if isinstance(obj, models.Request):
+            stale.append(obj.id)
+    for obj in session.dirty:
+        if not isinstance(obj, models.Request):
+            continue
+        current = _current(obj)
+        if current != _before(obj):
+            stale.append(obj.id)
+            fresh.append((obj, current))
+    rows = [
+        {"request_id": obj.id, "user_id": current[0], "stage": current[1], "received_at": obj.updated_at or datetime.utcnow()}
+        for obj, current in fresh if current
+    ]
+    if not (stale or rows):
+        return
+    table = models.PendingAssignment.__table__
+    connection = session.connection()
+    if stale:
+        connection.execute(table.delete().where(table.c.request_id.in_(stale)))
+    if rows:
+        connection.execute(table.insert(), rows)
+
+def _expected():
+    # SQL form of assignment(); Postgres arrays are 1-based.
+    r = models.Request
+    is_new = r.status == "NEW"
+    return select(
+        r.id,
+        case((is_new, r.supervisor_id), else_=r.approvers[r.current_approver_index + 1]),
+        case((is_new, 0), else_=r.current_approver_index + 1),
+        func.coalesce(r.updated_at, r.created_at, func.now()),
+    ).where(or_(is_new, and_(r.status == "IN_PROGRESS", r.current_approver_index < func.cardinality(r.approvers))))
+
+def _lock(db: Session):
+    # Block writers on requests while the snapshot is taken so no change is
+    # lost, and other rebuilds until this one commits.
+    db.execute(text("LOCK TABLE requests IN SHARE MODE"))
+    db.execute(text("LOCK TABLE pending_assignments IN EXCLUSIVE MODE"))
+
+def _fill(db: Session):
+    table = models.PendingAssignment.__table__
+    db.execute(table.delete())
+    db.execute(table.insert().from_select(["request_id", "user_id", "stage", "received_at"], _expected()))
+
+def rebuild(db: Session):
+    _lock(db)
+    _fill(db)
+    db.commit()
+
+def check(db: Session):
+    """Compare pending_assignments with what requests says it should hold."""
+    table = models.PendingAssignment.__table__
+    expected = _expected()
+    expected = expected.with_only_columns(*expected.selected_columns[:3])
+    actual = select(table.c.request_id, table.c.user_id, table.c.stage)
+    missing = db.execute(expected.except_(actual)).all()
+    unexpected = db.execute(actual.except_(expected)).all()
+    return {
+        "consistent": not (missing or unexpected),
+        "missing": [{"request_id": r, "user_id": u, "stage": s} for r, u, s in missing],
+        "unexpected": [{"request_id": r, "user_id": u, "stage": s} for r, u, s in unexpected],
+    }
+
+def ensure_seeded(db: Session):
+    # For a table create_all has just added; migration 0004 seeds it otherwise.
+    # Emptiness is re-checked under the lock, so concurrently starting workers
+    # fill it once.
+    _lock(db)
+    if db.query(models.PendingAssignment).first() is None:
+        _fill(db)
+    db.commit()
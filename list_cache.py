@@ -0,0 +1,42 @@
+import hashlib
+from fastapi import Request, Response
+from cache import TTLCache
+from config import LIST_CACHE_TTL_SECONDS, LIST_CACHE_MAX_ENTRIES
+import serialization
+
+# Polled list endpoints answer from a version token (see crud.requests_version)
+# computed before any hydration: it becomes the ETag, a matching If-None-Match
+# gets a 304, and serialised bodies are cached in-process under it. The token
+# only tracks requests, so a renamed user shows up in cached listings once one
+# of their requests changes or the entry expires.
+
+bodies = TTLCache(LIST_CACHE_MAX_ENTRIES, LIST_CACHE_TTL_SECONDS)
+
+def etag(request: Request, *version) -> str:
+    # The query string is part of the key: each filter combination is its own listing.
+    raw = "|".join(map(str, (request.url.path, request.url.query, *version)))
+    return '"' + hashlib.sha256(raw.encode()).hexdigest()[:32] + '"'
+
+def not_modified(request: Request, tag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return "*" in candidates or tag in candidates
+
+def cached(request: Request, tag: str):
+    """The response for tag when the client or the body cache already has it, else None."""
+    if not_modified(request, tag):
+        return Response(status_code=304, headers={"ETag": tag})
+    entry = bodies.get(tag)
+    if entry is None:
+        return None
+    body, headers = entry
+    return Response(body, media_type="application/json", headers={"ETag": tag, **headers})
+
+def render(tag: str, responses, headers: dict = None) -> Response:
+    """Serialise request responses, cache the body under tag and return it."""
+    headers = headers or {}
+    body = serialization.dumps(responses)
+    bodies.set(tag, (body, headers))
+    return Response(body, media_type="application/json", headers={"ETag": tag, **headers})
@@ -1,13 +1,61 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import inspect
+from sqlalchemy.orm.exc import StaleDataError
+from starlette.concurrency import run_in_threadpool
+import database
+from database import engine, async_engine, Base, SessionLocal
+from config import (
+    TOKEN_SWEEP_INTERVAL_SECONDS, METRICS_ENABLED, DEBUG, QUERY_BUDGET_MODE,
+    AUTO_CREATE_SCHEMA, DB_POOL_WARMUP
+)
 import models
+import counters  # registers the request_counters flush hook
+import inbox  # registers the pending_assignments flush hook
+import token_sweeper
+import passwords
+import metrics
+import query_budget
 from routes import auth as auth_routes, requests as request_routes, admin as admin_routes
 
-# Create all tables (you may use alembic for migrations in production)
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+
+def _prepare_schema():
+    # Create all tables (you may use alembic for migrations in production).
+    # Existing databases are upgraded with `alembic upgrade head`; one created
+    # here should be marked current with `alembic stamp head`.
+    if not AUTO_CREATE_SCHEMA:
+        return
+    existing = set(inspect(engine).get_table_names())
+    Base.metadata.create_all(bind=engine)
+    # Derived tables create_all has just added start empty; fill them from requests.
+    if models.RequestCounter.__tablename__ not in existing:
+        with SessionLocal() as db:
+            counters.ensure_seeded(db)
+    if models.PendingAssignment.__tablename__ not in existing:
+        with SessionLocal() as db:
+            inbox.ensure_seeded(db)
 
-app = FastAPI(title="Request Management System")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing touches the database at import; startup work happens here, once
+    # per worker, before the first request is accepted.
+    await run_in_threadpool(_prepare_schema)
+    try:
+        await database.warm_up_pools(DB_POOL_WARMUP)
+    except Exception:
+        logger.warning("Connection pool warm-up failed; connections will be opened on demand", exc_info=True)
+    sweeper = asyncio.create_task(token_sweeper.run_forever()) if TOKEN_SWEEP_INTERVAL_SECONDS > 0 else None
+    yield
+    if sweeper:
+        sweeper.cancel()
+    passwords.shutdown()
+
+app = FastAPI(title="Request Management System", lifespan=lifespan)
 
 # CORS Configuration
 app.add_middleware(
@@ -16,8 +64,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all HTTP methods
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["X-Next-Cursor", "X-Query-Count", "X-DB-Time-ms"],  # pagination cursor; debug query stats
 )
 
+if METRICS_ENABLED:
+    metrics.instrument_engine(engine)
+    metrics.instrument_engine(async_engine.sync_engine)
+    app.add_middleware(metrics.MetricsMiddleware, debug_headers=DEBUG)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics_endpoint():
+        return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+if QUERY_BUDGET_MODE != "off":
+    query_budget.instrument_engine(engine)
+    query_budget.instrument_engine(async_engine.sync_engine)
+
 app.include_router(auth_routes.router)
 app.include_router(request_routes.router)
 app.include_router(admin_routes.router)
@@ -26,9 +88,15 @@ app.include_router(admin_routes.router)
 def server():
     return "Server is Active"
 
+@app.exception_handler(StaleDataError)
+async def stale_data_handler(request, exc):
+    # Request.version is checked on every ORM update (see workflow.py); a write
+    # that lost the race against a concurrent one is reported, not retried.
+    return JSONResponse(status_code=409, content={"detail": "The request was changed concurrently, please retry."})
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     import traceback
     # Here you could log the error using your CRUD error log function.
     # For now, we simply return a generic error message.
-    return {"detail": "Internal server error"}
+    return JSONResponse(status_code=500, content={"detail": "Internal server error"})
@@ -0,0 +1,157 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+
+# Per-route request metrics in the Prometheus text format, plus the number of
+# SQL statements and the database time each request spent. Statements are
+# attributed to the request through a context variable, which follows the
+# request into the threadpool and into AsyncSession's greenlets.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+UNMATCHED_ROUTE = "<unmatched>"
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+current_request: ContextVar = ContextVar("current_request", default=None)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name: str, labels: str):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        cumulative += self.counts[-1]
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum:.6f}"
+        yield f"{name}_count{{{labels}}} {cumulative}"
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.queries = {}
+        self.db_seconds = {}
+        self.in_flight = 0
+        self.responses = {}
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, key, status: int, seconds: float, stats: RequestStats):
+        with self._lock:
+            self.in_flight -= 1
+            self.responses[key + (status,)] = self.responses.get(key + (status,), 0) + 1
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.queries.setdefault(key, Histogram(QUERY_BUCKETS)).observe(stats.queries)
+            self.db_seconds[key] = self.db_seconds.get(key, 0.0) + stats.db_seconds
+
+    def render(self):
+        def labels(method, route):
+            return f'method="{method}",route="{route}"'
+        with self._lock:
+            out = [
+                "# HELP http_requests_total Responses by route and status code.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route, status), count in sorted(self.responses.items()):
+                out.append(f'http_requests_total{{{labels(method, route)},status="{status}"}} {count}')
+            out += [
+                "# HELP http_requests_in_flight Requests currently being handled.",
+                "# TYPE http_requests_in_flight gauge",
+                f"http_requests_in_flight {self.in_flight}",
+                "# HELP http_request_duration_seconds Request latency.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for key, histogram in sorted(self.latency.items()):
+                out.extend(histogram.lines("http_request_duration_seconds", labels(*key)))
+            out += [
+                "# HELP http_request_db_queries SQL statements issued per request.",
+                "# TYPE http_request_db_queries histogram",
+            ]
+            for key, histogram in sorted(self.queries.items()):
+                out.extend(histogram.lines("http_request_db_queries", labels(*key)))
+            out += [
+                "# HELP http_request_db_seconds_total Time spent executing SQL.",
+                "# TYPE http_request_db_seconds_total counter",
+            ]
+            for key, seconds in sorted(self.db_seconds.items()):
+                out.append(f"http_request_db_seconds_total{{{labels(*key)}}} {seconds:.6f}")
+        return "\n".join(out) + "\n"
+
+registry = Registry()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_request.get() is not None:
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_request.get()
+    if stats is not None and conn.info.get("metrics_query_start"):
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - conn.info["metrics_query_start"].pop()
+
+def _handle_error(exception_context):
+    stats = current_request.get()
+    starts = exception_context.connection.info.get("metrics_query_start") if exception_context.connection else None
+    if stats is not None and starts:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - starts.pop()
+
+def instrument_engine(sync_engine):
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+class MetricsMiddleware:
+    """ASGI middleware feeding the registry; optionally reports query counts in response headers."""
+
+    def __init__(self, app, debug_headers: bool = False):
+        self.app = app
+        self.debug_headers = debug_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.debug_headers:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-query-count", str(stats.queries).encode()))
+                    headers.append((b"x-db-time-ms", f"{stats.db_seconds * 1000:.1f}".encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        registry.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Routing stores the matched route in the scope; label by its
+            # template so /requests/1 and /requests/2 share a series.
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            registry.finish((scope["method"], route), status, time.perf_counter() - start, stats)
+            current_request.reset(token)
@@ -0,0 +1,120 @@
+"""Baseline: the schema as created by Base.metadata.create_all
+
+Databases that predate migrations already have these tables; mark them with
+`alembic stamp 0001` and upgrade from there.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("role", postgresql.ARRAY(sa.Integer()), nullable=True),
+        sa.Column("email", sa.String(), nullable=False, unique=True),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+
+    op.create_table(
+        "requests",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("initiator_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("supervisor_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("subject", sa.String(), nullable=False),
+        sa.Column("description", sa.Text(), nullable=False),
+        sa.Column("area", sa.String(), nullable=False),
+        sa.Column("project", sa.String(), nullable=False),
+        sa.Column("tower", sa.String(), nullable=False),
+        sa.Column("department", sa.String(), nullable=False),
+        sa.Column("references", sa.String(), nullable=True),
+        sa.Column("priority", sa.String(), nullable=False),
+        sa.Column("approvers", postgresql.ARRAY(sa.Integer()), nullable=True),
+        sa.Column("current_approver_index", sa.Integer(), nullable=True),
+        sa.Column("status", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("last_action", sa.String(), nullable=True),
+        sa.Column("supervisor_approved_at", sa.DateTime(), nullable=True),
+        sa.Column("supervisor_approved", sa.Boolean(), nullable=True),
+        sa.Column("supervisor_comment", sa.Text(), nullable=True),
+        sa.Column("files", postgresql.JSONB(), nullable=True),
+    )
+    op.create_index("ix_requests_id", "requests", ["id"])
+
+    op.create_table(
+        "approver_actions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("request_id", sa.Integer(), sa.ForeignKey("requests.id"), nullable=False),
+        sa.Column("approver_id", sa.Integer(), nullable=False),
+        sa.Column("approved", sa.String(), nullable=False),
+        sa.Column("received_at", sa.String(), nullable=True),
+        sa.Column("action_time", sa.String(), nullable=True),
+        sa.Column("comment", sa.Text(), nullable=True),
+        sa.Column("approved_by", sa.String(), nullable=True),
+    )
+    op.create_index("ix_approver_actions_id", "approver_actions", ["id"])
+
+    op.create_table(
+        "request_counters",
+        sa.Column("initiator_id", sa.Integer(), primary_key=True),
+        sa.Column("status", sa.String(), primary_key=True),
+        sa.Column("count", sa.Integer(), nullable=False),
+    )
+
+    op.create_table(
+        "file_blobs",
+        sa.Column("sha256", sa.String(64), primary_key=True),
+        sa.Column("path", sa.String(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+    )
+
+    op.create_table(
+        "error_logs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("endpoint", sa.String(), nullable=False),
+        sa.Column("error_message", sa.Text(), nullable=False),
+        sa.Column("traceback", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.String(), nullable=False),
+    )
+    op.create_index("ix_error_logs_id", "error_logs", ["id"])
+
+    op.create_table(
+        "tokens",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("token", sa.String(), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("created_at", sa.String(), nullable=False),
+        sa.Column("ip_address", sa.String(), nullable=True),
+        sa.Column("user_agent", sa.String(), nullable=True),
+    )
+    op.create_index("ix_tokens_id", "tokens", ["id"])
+    op.create_index("ix_tokens_token", "tokens", ["token"], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ("tokens", "error_logs", "file_blobs", "request_counters", "approver_actions", "requests", "users"):
+        op.drop_table(table)
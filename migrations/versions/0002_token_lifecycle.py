@@ -0,0 +1,47 @@
+"""Token lifecycle: hashed keys, expires_at and its indexes
+
+Existing rows are rewritten to the sha256 of the stored JWT and given an
+expiry of created_at + ACCESS_TOKEN_EXPIRE_MINUTES, so sessions issued before
+the upgrade keep working and are swept once they lapse.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from config import ACCESS_TOKEN_EXPIRE_MINUTES
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("tokens", sa.Column("expires_at", sa.DateTime(), nullable=True))
+    op.execute(sa.text(
+        "UPDATE tokens SET "
+        "token = encode(sha256(convert_to(token, 'UTF8')), 'hex'), "
+        "expires_at = created_at::timestamp + make_interval(mins => :minutes)"
+    ).bindparams(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    op.alter_column("tokens", "token", type_=sa.String(64), existing_nullable=False)
+    op.create_index("ix_tokens_expires_at", "tokens", ["expires_at"])
+    op.create_index("ix_tokens_user_id_expires_at", "tokens", ["user_id", "expires_at"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The original JWTs cannot be recovered from their hashes.
+    op.drop_index("ix_tokens_user_id_expires_at", table_name="tokens")
+    op.drop_index("ix_tokens_expires_at", table_name="tokens")
+    op.execute("DELETE FROM tokens")
+    op.alter_column("tokens", "token", type_=sa.String(), existing_nullable=False)
+    op.drop_column("tokens", "expires_at")
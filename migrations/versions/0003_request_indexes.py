@@ -0,0 +1,57 @@
+"""Indexes for request listing, filtering and approval lookups
+
+Duplicate approver_actions rows (same request and approver) are removed,
+keeping the earliest, before the unique constraint is added. Indexes are
+built CONCURRENTLY so the upgrade does not block writes on a live database.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    ("ix_requests_status", "requests", ["status"], {}),
+    ("ix_requests_initiator_id", "requests", ["initiator_id"], {}),
+    ("ix_requests_supervisor_id", "requests", ["supervisor_id"], {}),
+    ("ix_requests_created_at", "requests", ["created_at"], {}),
+    ("ix_requests_updated_at_id", "requests", ["updated_at", "id"], {}),
+    ("ix_requests_approvers", "requests", ["approvers"], {"postgresql_using": "gin"}),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        "DELETE FROM approver_actions a USING approver_actions b "
+        "WHERE a.request_id = b.request_id AND a.approver_id = b.approver_id AND a.id > b.id"
+    )
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True, **options)
+        op.create_index(
+            "uq_approver_actions_request_approver", "approver_actions", ["request_id", "approver_id"],
+            unique=True, postgresql_concurrently=True, if_not_exists=True,
+        )
+    op.execute(
+        "ALTER TABLE approver_actions ADD CONSTRAINT uq_approver_actions_request_approver "
+        "UNIQUE USING INDEX uq_approver_actions_request_approver"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint("uq_approver_actions_request_approver", "approver_actions", type_="unique")
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
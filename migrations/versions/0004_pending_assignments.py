@@ -0,0 +1,53 @@
+"""pending_assignments inbox table
+
+Creates the table behind GET /requests/inbox and fills it from requests: the
+supervisor of every NEW request (stage 0) and the current approver of every
+IN_PROGRESS request (stage current_approver_index + 1).
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "pending_assignments",
+        sa.Column("request_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("stage", sa.Integer(), nullable=False),
+        sa.Column("received_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["request_id"], ["requests.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("request_id"),
+    )
+    op.execute(
+        "INSERT INTO pending_assignments (request_id, user_id, stage, received_at) "
+        "SELECT id, "
+        "CASE WHEN status = 'NEW' THEN supervisor_id ELSE approvers[current_approver_index + 1] END, "
+        "CASE WHEN status = 'NEW' THEN 0 ELSE current_approver_index + 1 END, "
+        "COALESCE(updated_at, created_at, now()) "
+        "FROM requests "
+        "WHERE status = 'NEW' OR (status = 'IN_PROGRESS' AND current_approver_index < cardinality(approvers))"
+    )
+    op.create_index(
+        "ix_pending_assignments_user_id_received_at", "pending_assignments", ["user_id", "received_at"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_pending_assignments_user_id_received_at", table_name="pending_assignments")
+    op.drop_table("pending_assignments")
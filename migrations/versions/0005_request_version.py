@@ -0,0 +1,33 @@
+"""Request version column for optimistic concurrency
+
+Existing rows start at version 1. The server default only serves the
+backfill; the application sets the version itself.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A constant default is stored in the catalog, so this does not rewrite requests.
+    op.add_column("requests", sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+    op.alter_column("requests", "version", server_default=None)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("requests", "version")
@@ -0,0 +1,109 @@
+"""Native timestamp columns for approver actions, tokens and error logs
+
+approver_actions.received_at/action_time ("DD-MM-YYYY HH24:MI"), and
+tokens.created_at and error_logs.created_at (ISO 8601), become timestamptz
+columns with indexes. All of them were written from UTC clocks. The values
+are parsed into new columns in batches of BATCH_SIZE rows, each committed on
+its own, so the upgrade never holds a long lock. Rows written meanwhile are
+caught up under an exclusive lock just before the columns are swapped.
+Values that match neither format become NULL (now() for the NOT NULL
+columns).
+
+tokens.expires_at was already a timestamp without time zone holding UTC
+values; with the session time zone at UTC the change to timestamptz needs
+no table rewrite.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10000
+
+# table -> [(column, nullable, format written back on downgrade)]
+COLUMNS = {
+    "approver_actions": [("received_at", True, "DD-MM-YYYY HH24:MI"), ("action_time", True, "DD-MM-YYYY HH24:MI")],
+    "tokens": [("created_at", False, 'YYYY-MM-DD"T"HH24:MI:SS.US')],
+    "error_logs": [("created_at", False, 'YYYY-MM-DD"T"HH24:MI:SS.US')],
+}
+
+# table -> [column] of naive UTC timestamps that only gain the time zone
+RETYPED = {"tokens": ["expires_at"]}
+
+
+def _parsed(column: str, nullable: bool) -> str:
+    # Runs with the session time zone set to UTC, so offset-less values are UTC.
+    value = (
+        f"CASE WHEN {column} ~ '^\\d{{2}}-\\d{{2}}-\\d{{4}} \\d{{2}}:\\d{{2}}$' "
+        f"THEN to_timestamp({column}, 'DD-MM-YYYY HH24:MI') "
+        f"WHEN {column} ~ '^\\d{{4}}-\\d{{2}}-\\d{{2}}' THEN {column}::timestamptz END"
+    )
+    return value if nullable else f"coalesce({value}, now())"
+
+
+def _assignments(table: str) -> str:
+    return ", ".join(f"{column}_tz = {_parsed(column, nullable)}" for column, nullable, _ in COLUMNS[table])
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    op.execute("SET TIME ZONE 'UTC'")
+    for table, columns in COLUMNS.items():
+        for column, _, _ in columns:
+            op.add_column(table, sa.Column(f"{column}_tz", sa.DateTime(timezone=True), nullable=True))
+
+    with op.get_context().autocommit_block():
+        for table in COLUMNS:
+            low, high = bind.execute(sa.text(f"SELECT min(id), max(id) FROM {table}")).one()
+            if low is None:
+                continue
+            for start in range(low, high + 1, BATCH_SIZE):
+                bind.execute(
+                    sa.text(f"UPDATE {table} SET {_assignments(table)} WHERE id >= :start AND id < :end"),
+                    {"start": start, "end": start + BATCH_SIZE},
+                )
+
+    for table, columns in COLUMNS.items():
+        op.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+        missed = " OR ".join(f"({column}_tz IS NULL AND {column} IS NOT NULL)" for column, _, _ in columns)
+        op.execute(f"UPDATE {table} SET {_assignments(table)} WHERE {missed}")
+        for column, nullable, _ in columns:
+            op.drop_column(table, column)
+            op.alter_column(table, f"{column}_tz", new_column_name=column, nullable=nullable)
+
+    for table, columns in RETYPED.items():
+        for column in columns:
+            op.alter_column(table, column, type_=sa.DateTime(timezone=True), existing_type=sa.DateTime())
+
+    with op.get_context().autocommit_block():
+        for table, columns in COLUMNS.items():
+            for column, _, _ in columns:
+                op.create_index(f"ix_{table}_{column}", table, [column], postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("SET TIME ZONE 'UTC'")
+    for table, columns in RETYPED.items():
+        for column in columns:
+            op.alter_column(table, column, type_=sa.DateTime(), existing_type=sa.DateTime(timezone=True))
+    for table, columns in COLUMNS.items():
+        for column, nullable, fmt in columns:
+            op.drop_index(f"ix_{table}_{column}", table_name=table)
+            op.alter_column(
+                table, column, type_=sa.String(), existing_nullable=nullable,
+                postgresql_using=f"to_char({column}, '{fmt}')",
+            )
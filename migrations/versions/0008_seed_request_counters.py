@@ -0,0 +1,39 @@
+"""Seed request_counters from requests
+
+The flush hook now maintains request_counters whether or not
+REQUEST_COUNTERS_ENABLED is set, so the table is filled once here from the
+current requests. Writers are blocked for the duration of the count.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, Sequence[str], None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("LOCK TABLE requests IN SHARE MODE")
+    op.execute("DELETE FROM request_counters")
+    op.execute(
+        "INSERT INTO request_counters (initiator_id, status, count) "
+        "SELECT initiator_id, coalesce(status, 'NEW'), count(*) FROM requests "
+        "GROUP BY initiator_id, coalesce(status, 'NEW')"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The counts stay valid; nothing to undo.
+    pass
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey
-from sqlalchemy.dialects.postgresql import ARRAY, JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Computed, DDL, Integer, String, DateTime, Boolean, Text, ForeignKey, Index, UniqueConstraint, event
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR
+from sqlalchemy.orm import relationship, column_property, deferred
 from datetime import datetime
 from database import Base
 
@@ -17,11 +17,23 @@ class User(Base):
     requests_supervised = relationship("Request", back_populates="supervisor", foreign_keys='Request.supervisor_id')
     tokens = relationship("Token", back_populates="user")
 
+    # Trigram index for the substring (ILIKE '%...%') initiator-name filters.
+    __table_args__ = (Index("ix_users_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),)
+
+# Weighted text searched by GET /requests/search; the subject ranks highest.
+SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(subject, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(project, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'C') || "
+    "setweight(to_tsvector('english', coalesce(\"references\", '')), 'C')"
+)
+
 class Request(Base):
     __tablename__ = "requests"
     id = Column(Integer, primary_key=True, index=True)
-    initiator_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    supervisor_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # active_history keeps the previous value available to flush hooks (see counters.py)
+    initiator_id = column_property(Column(Integer, ForeignKey("users.id"), nullable=False, index=True), active_history=True)
+    supervisor_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     subject = Column(String, nullable=False)
     description = Column(Text, nullable=False)
     area = Column(String, nullable=False)
@@ -32,47 +44,94 @@ class Request(Base):
     priority = Column(String, nullable=False)
     approvers = Column(ARRAY(Integer), default=[])
     current_approver_index = Column(Integer, default=0)
-    status = Column(String, default="NEW")
-    created_at = Column(DateTime, default=datetime.utcnow)
+    status = column_property(Column(String, default="NEW", index=True), active_history=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     last_action = Column(String, nullable=True)
     supervisor_approved_at = Column(DateTime, nullable=True)
     supervisor_approved = Column(Boolean, nullable=True)
     supervisor_comment = Column(Text, nullable=True)
     files = Column(JSONB, default=[])
+    # Bumped on every UPDATE, which only matches the version that was read (see workflow.py).
+    version = Column(Integer, nullable=False, default=1)
+    # Maintained by Postgres; deferred so ordinary loads never fetch it.
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_DOCUMENT, persisted=True)))
 
     initiator = relationship("User", foreign_keys=[initiator_id], back_populates="requests_initiated")
     supervisor = relationship("User", foreign_keys=[supervisor_id], back_populates="requests_supervised")
     approver_actions = relationship("ApproverAction", back_populates="request")
 
+    __table_args__ = (
+        # Keyset pagination order of GET /requests/ (updated_at desc, id desc).
+        Index("ix_requests_updated_at_id", "updated_at", "id"),
+        # Containment lookups (approvers @> ARRAY[...]) for request visibility.
+        Index("ix_requests_approvers", "approvers", postgresql_using="gin"),
+        Index("ix_requests_search_vector", "search_vector", postgresql_using="gin"),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
 class ApproverAction(Base):
     __tablename__ = "approver_actions"
     id = Column(Integer, primary_key=True, index=True)
     request_id = Column(Integer, ForeignKey("requests.id"), nullable=False)
     approver_id = Column(Integer, nullable=False)
     approved = Column(String, nullable=False)  # "APPROVED" or "REJECTED"
-    received_at = Column(String, nullable=True)
-    action_time = Column(String, nullable=True)
+    received_at = Column(DateTime(timezone=True), nullable=True, index=True)
+    action_time = Column(DateTime(timezone=True), nullable=True, index=True)
     comment = Column(Text, nullable=True)
     approved_by = Column(String, nullable=True)
 
     request = relationship("Request", back_populates="approver_actions")
 
+    # One action per approver and request; its index also serves lookups by request_id.
+    __table_args__ = (UniqueConstraint("request_id", "approver_id", name="uq_approver_actions_request_approver"),)
+
+class RequestCounter(Base):
+    __tablename__ = "request_counters"
+    initiator_id = Column(Integer, primary_key=True)
+    status = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class PendingAssignment(Base):
+    # The one user a request is waiting on, maintained by inbox.py.
+    __tablename__ = "pending_assignments"
+    request_id = Column(Integer, ForeignKey("requests.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    stage = Column(Integer, nullable=False)  # 0 = supervisor, n = approvers[n - 1]
+    received_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (Index("ix_pending_assignments_user_id_received_at", "user_id", "received_at"),)
+
+class FileBlob(Base):
+    __tablename__ = "file_blobs"
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class ErrorLog(Base):
     __tablename__ = "error_logs"
     id = Column(Integer, primary_key=True, index=True)
     endpoint = Column(String, nullable=False)
     error_message = Column(Text, nullable=False)
     traceback = Column(Text, nullable=False)
-    created_at = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, index=True)
 
 class Token(Base):
     __tablename__ = "tokens"
     id = Column(Integer, primary_key=True, index=True)
-    token = Column(String, unique=True, index=True, nullable=False)
+    # sha256 hex digest of the JWT; the token itself is never stored.
+    token = Column(String(64), unique=True, index=True, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    created_at = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    expires_at = Column(DateTime(timezone=True), nullable=True, index=True)
     ip_address = Column(String, nullable=True)
     user_agent = Column(String, nullable=True)
 
+    __table_args__ = (Index("ix_tokens_user_id_expires_at", "user_id", "expires_at"),)
+
     user = relationship("User", back_populates="tokens")
+
+# gin_trgm_ops comes from pg_trgm; make sure it exists before create_all builds the index.
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
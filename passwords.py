@@ -0,0 +1,68 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+from config import BCRYPT_ROUNDS, BCRYPT_WORKERS, BCRYPT_MAX_QUEUE, BCRYPT_RETRY_AFTER_SECONDS
+
+# Hashes at any other cost verify as usual but are reported as needing an
+# update, which login uses to rehash transparently after BCRYPT_ROUNDS changes.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# bcrypt runs in a dedicated process pool so a login storm cannot occupy the
+# threadpool the rest of the API depends on. At most BCRYPT_WORKERS jobs run
+# and BCRYPT_MAX_QUEUE wait; anything beyond that is rejected with a 503.
+_executor = None
+_pending = 0
+
+def _hash(password: str):
+    return pwd_context.hash(password)
+
+def _verify_and_update(password: str, hashed_password: str):
+    return pwd_context.verify_and_update(password, hashed_password)
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # spawn keeps the workers free of the parent's threads and DB connections.
+        _executor = ProcessPoolExecutor(max_workers=BCRYPT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+async def _submit(fn, *args):
+    global _pending
+    if _pending >= max(BCRYPT_WORKERS, 1) + BCRYPT_MAX_QUEUE:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many concurrent sign-ins, please retry shortly.",
+            headers={"Retry-After": str(BCRYPT_RETRY_AFTER_SECONDS)},
+        )
+    _pending += 1
+    try:
+        if BCRYPT_WORKERS <= 0:
+            return await run_in_threadpool(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+    finally:
+        _pending -= 1
+
+async def hash_password(password: str):
+    return await _submit(_hash, password)
+
+async def verify_and_update(password: str, hashed_password: str):
+    """Return (valid, new_hash); new_hash is None unless the stored hash should be replaced."""
+    return await _submit(_verify_and_update, password, hashed_password)
+
+def stats():
+    return {"workers": BCRYPT_WORKERS, "max_queue": BCRYPT_MAX_QUEUE, "pending": _pending}
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
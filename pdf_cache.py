@@ -0,0 +1,83 @@
+import os
+import glob
+import calendar
+import tempfile
+from email.utils import formatdate, parsedate_to_datetime
+import models, utils
+from config import PDF_CACHE_DIR, PDF_CACHE_MAX_BYTES
+
+# Rendered PDFs of approved NFAs, keyed by (request_id, updated_at). Any change
+# to a request bumps updated_at, so a stale rendering is never served. Files
+# are evicted least-recently-used first (mtime is refreshed on every hit) once
+# the directory grows past PDF_CACHE_MAX_BYTES.
+
+def _version(req: models.Request):
+    return req.updated_at.strftime("%Y%m%d%H%M%S%f")
+
+def etag(req: models.Request):
+    return f'"nfa-{req.id}-{_version(req)}"'
+
+def last_modified(req: models.Request):
+    return formatdate(calendar.timegm(req.updated_at.timetuple()), usegmt=True)
+
+def is_not_modified(req: models.Request, if_none_match: str = None, if_modified_since: str = None):
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag(req) in tags or f"W/{etag(req)}" in tags
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return calendar.timegm(req.updated_at.timetuple()) <= since.timestamp()
+    return False
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _evict(keep: str):
+    entries = []
+    total = 0
+    with os.scandir(PDF_CACHE_DIR) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+    entries.sort()
+    for _, size, path in entries:
+        if total <= PDF_CACHE_MAX_BYTES:
+            break
+        if path != keep:
+            _remove(path)
+            total -= size
+
+def _path(req: models.Request):
+    return os.path.join(PDF_CACHE_DIR, f"{req.id}_{_version(req)}.pdf")
+
+def cached_pdf_path(req: models.Request):
+    # Returns None on a miss; a hit counts as a use for LRU eviction.
+    path = _path(req)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+def store_pdf(req: models.Request, initiator_name: str, supervisor_name: str):
+    """Render the PDF for req into the cache and return its path. Blocking."""
+    path = _path(req)
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    buffer = utils.render_pdf(req, initiator_name, supervisor_name)
+    fd, tmp_path = tempfile.mkstemp(dir=PDF_CACHE_DIR, prefix=".render-")
+    with os.fdopen(fd, "wb") as out:
+        out.write(buffer.getvalue())
+    os.replace(tmp_path, path)
+    for stale in glob.glob(os.path.join(PDF_CACHE_DIR, f"{req.id}_*.pdf")):
+        if stale != path:
+            _remove(stale)
+    _evict(keep=path)
+    return path
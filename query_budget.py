@@ -0,0 +1,107 @@
+import asyncio
+import functools
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from config import QUERY_BUDGET_MODE
+
+# Guards against N+1 regressions. A budget caps the SQL statements issued
+# inside a block or a route handler; per_item additionally allows that many
+# statements per element of a list result, so a route declared with
+# per_item=0 fails as soon as its query count starts to grow with the size of
+# its response. QUERY_BUDGET_MODE decides what an overrun does: "raise" (tests)
+# raises QueryBudgetExceeded, "log" (staging) logs an error, "off" skips the
+# bookkeeping entirely. MODE is read on every call, so tests can switch it on
+# after the routes have been imported.
+
+logger = logging.getLogger(__name__)
+
+MODE = QUERY_BUDGET_MODE
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+class QueryCounter:
+    __slots__ = ("count", "statements", "items")
+
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+        self.items = None
+
+_active: ContextVar = ContextVar("query_budget_counters", default=())
+
+def _count(conn, cursor, statement, parameters, context, executemany):
+    for counter in _active.get():
+        counter.count += 1
+        counter.statements.append(statement)
+
+def report_items(items: int):
+    """Size of the list a handler returns inside a Response, which limit() cannot count."""
+    for counter in _active.get():
+        counter.items = items
+
+def instrument_engine(sync_engine):
+    if not event.contains(sync_engine, "before_cursor_execute", _count):
+        event.listen(sync_engine, "before_cursor_execute", _count)
+
+@contextmanager
+def count_queries():
+    """Count the statements executed on instrumented engines inside the block."""
+    counter = QueryCounter()
+    token = _active.set(_active.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _active.reset(token)
+
+def check(counter: QueryCounter, max_queries: int, label: str, items: int = 0, per_item: float = 0, mode: str = None):
+    mode = mode or MODE
+    allowed = max_queries + per_item * items
+    if mode == "off" or counter.count <= allowed:
+        return
+    message = f"{label} issued {counter.count} SQL statements for {items} items; budget is {allowed:g}"
+    if mode == "raise":
+        raise QueryBudgetExceeded(message + ":\n" + "\n".join(counter.statements))
+    logger.error(message)
+
+@contextmanager
+def query_budget(max_queries: int, label: str = "block", mode: str = None):
+    with count_queries() as counter:
+        yield counter
+    check(counter, max_queries, label, mode=mode)
+
+def _items(counter: QueryCounter, result):
+    if counter.items is not None:
+        return counter.items
+    return len(result) if isinstance(result, (list, tuple)) else 0
+
+def limit(max_queries: int, per_item: float = 0):
+    """Declare the SQL budget of a route handler (dependencies are not counted).
+
+    Items are counted from a list result; handlers returning a Response report
+    theirs with report_items().
+    """
+    def decorate(endpoint):
+        label = endpoint.__name__
+        if asyncio.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def wrapper(*args, **kwargs):
+                if MODE == "off":
+                    return await endpoint(*args, **kwargs)
+                with count_queries() as counter:
+                    result = await endpoint(*args, **kwargs)
+                check(counter, max_queries, label, _items(counter, result), per_item)
+                return result
+        else:
+            @functools.wraps(endpoint)
+            def wrapper(*args, **kwargs):
+                if MODE == "off":
+                    return endpoint(*args, **kwargs)
+                with count_queries() as counter:
+                    result = endpoint(*args, **kwargs)
+                check(counter, max_queries, label, _items(counter, result), per_item)
+                return result
+        return wrapper
+    return decorate
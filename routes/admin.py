@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request
+from fastapi.responses import StreamingResponse
+from serialization import TrustedJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
 import os, json
-import schemas, crud, models, auth, utils
-from database import get_db
+import schemas, crud, models, auth, utils, uploads, database, async_crud, passwords, query_budget, counters, inbox, workflow, list_cache, export
+from database import get_db, get_async_db
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -13,45 +16,50 @@ def get_admin_user(current_user: models.User = Depends(lambda token=Depends(auth
         raise HTTPException(status_code=403, detail="Admin privileges required.")
     return current_user
 
+def get_admin_user_async(current_user: models.User = Depends(auth.get_current_user_async)):
+    return get_admin_user(current_user)
+
 @router.get("/total-requests")
 def total_requests(admin: models.User = Depends(get_admin_user), db: Session = Depends(get_db)):
-    total = len(crud.list_all_requests(db))
+    total = crud.count_requests(db)
     return {"total_requests": total}
 
 @router.get("/pending-requests")
 def pending_requests(admin: models.User = Depends(get_admin_user), db: Session = Depends(get_db)):
-    all_requests = crud.list_all_requests(db)
-    pending = [r for r in all_requests if r.status in ("NEW", "IN_PROGRESS")]
-    return {"total_pending_requests": len(pending)}
+    pending = crud.count_requests(db, statuses=("NEW", "IN_PROGRESS"))
+    return {"total_pending_requests": pending}
 
 @router.get("/users", response_model=List[schemas.UserResponse])
 def admin_view_all_users(admin: models.User = Depends(get_admin_user), db: Session = Depends(get_db)):
     return crud.list_all_users(db)
 
 @router.put("/users/{user_id}", response_model=schemas.UserResponse)
-def admin_edit_user(user_id: int, user_edit: schemas.AdminEditUser, admin: models.User = Depends(get_admin_user), db: Session = Depends(get_db)):
-    user = crud.get_user_by_id(db, user_id)
+async def admin_edit_user(user_id: int, user_edit: schemas.AdminEditUser, admin: models.User = Depends(get_admin_user_async), db: AsyncSession = Depends(get_async_db)):
+    user = await async_crud.get_user_by_id(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if user_edit.username:
         user.username = user_edit.username
     if user_edit.password:
-        user.hashed_password = auth.get_password_hash(user_edit.password)
+        user.hashed_password = await passwords.hash_password(user_edit.password)
     if user_edit.name:
         user.name = user_edit.name
     if user_edit.role is not None:
         user.role = user_edit.role
     if user_edit.email is not None:
         user.email = user_edit.email
-    crud.update_user(db, user)
+    await async_crud.update_user(db, user)
+    await db.commit()
+    auth.invalidate_user(user_id)
     return user
 
 @router.post("/users", response_model=schemas.UserResponse)
-def admin_create_user(user_data: schemas.AdminCreateUser, admin: models.User = Depends(get_admin_user), db: Session = Depends(get_db)):
-    if crud.get_user_by_username(db, user_data.username):
+async def admin_create_user(user_data: schemas.AdminCreateUser, admin: models.User = Depends(get_admin_user_async), db: AsyncSession = Depends(get_async_db)):
+    if await async_crud.get_user_by_username(db, user_data.username):
         raise HTTPException(status_code=400, detail="User with this username already exists.")
-    hashed_password = auth.get_password_hash(user_data.password)
-    new_user = crud.create_user(db, user_data, hashed_password)
+    hashed_password = await passwords.hash_password(user_data.password)
+    new_user = await async_crud.create_user(db, user_data, hashed_password)
+    await db.commit()
     return new_user
 
 @router.delete("/users/{user_id}")
@@ -61,16 +69,16 @@ def admin_delete_user(user_id: int, admin: models.User = Depends(get_admin_user)
         raise HTTPException(status_code=404, detail="User not found")
     db.delete(user)
     db.commit()
+    auth.invalidate_user(user_id)
     return {"detail": f"User {user_id} deleted successfully."}
 
 @router.get("/users/pending-requests")
+@query_budget.limit(2)
 def pending_requests_per_user(admin: models.User = Depends(get_admin_user), db: Session = Depends(get_db)):
-    users = crud.list_all_users(db)
-    all_requests = crud.list_all_requests(db)
+    pending_by_user = crud.count_requests_by_initiator(db, statuses=("NEW", "IN_PROGRESS"))
     results = []
-    for user in users:
-        pending = [r for r in all_requests if r.initiator_id == user.id and r.status in ("NEW", "IN_PROGRESS")]
-        results.append({"user_id": user.id, "pending_requests": len(pending)})
+    for user_id in crud.list_user_ids(db):
+        results.append({"user_id": user_id, "pending_requests": pending_by_user.get(user_id, 0)})
     return results
 
 @router.post("/requests/{request_id}/approve")
@@ -80,9 +88,10 @@ def admin_approve_request(request_id: int, admin: models.User = Depends(get_admi
         raise HTTPException(status_code=404, detail="Request not found")
     current_time = datetime.utcnow()
     req.status = "Approved by ADMIN"
-    req.last_action = f"Approved by ADMIN at {current_time.strftime('%d-%m-%Y %H:%M')}"
+    req.last_action = f"Approved by ADMIN at {utils.display_time(current_time)}"
     req.updated_at = current_time
     crud.update_request(db, req)
+    db.commit()
     return {"detail": f"Request {request_id} approved by ADMIN."}
 
 @router.get("/users/{user_id}/files")
@@ -108,8 +117,15 @@ def delete_request_file(request_id: int, file_url: str, current_user: models.Use
     updated_files = [file for file in original_files if utils.normalize_url(file.get("file_url", "")) != normalized_input_url]
     if len(updated_files) == len(original_files):
         raise HTTPException(status_code=404, detail="File not found in the request")
+    removed_files = [file for file in original_files if utils.normalize_url(file.get("file_url", "")) == normalized_input_url]
+    orphaned = uploads.release_file_records(db, removed_files)
     req.files = updated_files
     crud.update_request(db, req)
+    db.commit()
+    if any(file.get("sha256") for file in removed_files):
+        # Content-addressed blob: only unlinked once no request references it.
+        uploads.remove_orphaned_blobs(db, orphaned)
+        return {"detail": f"File {file_url} deleted successfully from request {request_id}."}
     if file_url.startswith("/files/"):
         relative_path = file_url[len("/files/"):]
     else:
@@ -129,21 +145,13 @@ def admin_add_files_to_request(request_id: int, files: Optional[List[UploadFile]
     req = crud.get_request_by_id(db, request_id)
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
-    file_records = req.files if req.files else []
+    uploads.check_upload_sizes(files)
+    file_records = list(req.files) if req.files else []
     for file in files:
-        original_filename = file.filename or "unnamed_file"
-        sanitized_filename = original_filename.replace(" ", "_")
-        timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-        new_filename = f"{request_id}_{timestamp}_{sanitized_filename}"
-        file_location = os.path.join(utils.UPLOAD_FOLDER, new_filename)
-        file.file.seek(0)
-        content = file.file.read()
-        with open(file_location, "wb") as f:
-            f.write(content)
-        file_record = {"file_url": f"/files/{new_filename}", "file_display_name": original_filename}
-        file_records.append(file_record)
+        file_records.append(uploads.store_request_file(db, file))
     req.files = file_records
     crud.update_request(db, req)
+    db.commit()
     return {"detail": f"Files added to request {request_id}.", "files": file_records}
 
 @router.post("/requests/{request_id}/comments")
@@ -156,24 +164,37 @@ def admin_add_comment(request_id: int, comment: str = Form(...), admin: models.U
     else:
         req.admin_comment = comment
     current_time = datetime.utcnow()
-    req.last_action = f"Admin comment added at {current_time.strftime('%d-%m-%Y %H:%M')}"
+    req.last_action = f"Admin comment added at {utils.display_time(current_time)}"
     req.updated_at = current_time
     crud.update_request(db, req)
+    db.commit()
     return {"detail": f"Comment added to request {request_id}.", "admin_comment": req.admin_comment}
 
 @router.get("/all-requests", response_model=List[schemas.RequestResponse])
-def admin_get_all_requests(admin: models.User = Depends(lambda token=Depends(auth.oauth2_scheme), db=Depends(get_db): auth.get_current_user(token, db)), db: Session = Depends(get_db)):
+@query_budget.limit(4)
+def admin_get_all_requests(request: Request, admin: models.User = Depends(lambda token=Depends(auth.oauth2_scheme), db=Depends(get_db): auth.get_current_user(token, db)), db: Session = Depends(get_db)):
+    tag = list_cache.etag(request, *crud.requests_version(db))
+    hit = list_cache.cached(request, tag)
+    if hit is not None:
+        return hit
     all_reqs = crud.list_all_requests(db)
-    detailed_requests = []
-    for r in all_reqs:
-        detailed = utils.to_request_response(db, r)
-        detailed["isApproved"] = "APPROVED" in r.status.upper()
-        detailed_requests.append(detailed)
-    return detailed_requests
+    query_budget.report_items(len(all_reqs))
+    return list_cache.render(tag, utils.to_request_responses(db, all_reqs))
+
+@router.get("/requests/export")
+def admin_export_requests(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), admin: models.User = Depends(get_admin_user)):
+    if format == "csv":
+        body, media_type = export.csv_lines(), "text/csv"
+    else:
+        body, media_type = export.ndjson_lines(), "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="requests.{format}"'}
+    return StreamingResponse(body, media_type=media_type, headers=headers)
 
 @router.get("/user-files", response_model=List[dict])
+@query_budget.limit(2)
 def admin_user_files(admin: models.User = Depends(get_admin_user), db: Session = Depends(get_db)):
     all_requests = crud.list_all_requests(db)
+    names = {u.id: u.name for u in crud.get_users_by_ids(db, [r.initiator_id for r in all_requests if r.initiator_id])}
     user_files_map = {}
     for r in all_requests:
         user_id = r.initiator_id
@@ -181,9 +202,7 @@ def admin_user_files(admin: models.User = Depends(get_admin_user), db: Session =
             continue
         files = r.files if r.files else []
         if user_id not in user_files_map:
-            user_obj = crud.get_user_by_id(db, user_id)
-            user_name = user_obj.name if user_obj else "Unknown"
-            user_files_map[user_id] = {"user_id": user_id, "user_name": user_name, "files": []}
+            user_files_map[user_id] = {"user_id": user_id, "user_name": names.get(user_id, "Unknown"), "files": []}
         user_files_map[user_id]["files"].extend(files)
     result = []
     for data in user_files_map.values():
@@ -201,97 +220,105 @@ def admin_approver_action(action: schemas.ApprovalAction, current_user: models.U
     current_time = datetime.utcnow()
     if action.approved:
         req.status = "APPROVED"
-        req.last_action = f"Admin approved at {current_time.strftime('%d-%m-%Y %H:%M')}"
+        req.last_action = f"Admin approved at {utils.display_time(current_time)}"
     else:
         req.status = "REJECTED"
-        req.last_action = f"Admin rejected at {current_time.strftime('%d-%m-%Y %H:%M')}"
+        req.last_action = f"Admin rejected at {utils.display_time(current_time)}"
     req.updated_at = current_time
     crud.update_request(db, req)
-    return utils.to_request_response(db, req)
+    db.commit()
+    return TrustedJSONResponse(utils.to_request_response(db, req))
 
 @router.post("/requests/stage-approve", response_model=schemas.RequestResponse)
 def admin_partial_stage_approve(action: schemas.ApprovalAction, current_user: models.User = Depends(get_admin_user), db: Session = Depends(get_db)):
-    req = crud.get_request_by_id(db, action.request_id)
-    if not req:
-        raise HTTPException(status_code=404, detail="Request not found")
-    if req.status in ("APPROVED", "REJECTED"):
-        raise HTTPException(status_code=400, detail=f"Request is already {req.status} and cannot be changed.")
-    current_time = datetime.utcnow()
-    if req.status == "NEW":
-        req.supervisor_approved = action.approved
-        req.supervisor_comment = f"[Admin Override] {action.comment or ''}".strip()
-        req.supervisor_approved_at = current_time
-        req.updated_at = current_time
-        if action.approved:
-            if req.approvers:
-                req.status = "IN_PROGRESS"
-                req.last_action = f"Admin override: Supervisor stage approved at {current_time.strftime('%d-%m-%Y %H:%M')}"
-                req.current_approver_index = 0
+    comment = f"[Admin Override] {action.comment or ''}".strip()
+
+    def stage_approve(session, req, now):
+        if req.status in ("APPROVED", "REJECTED"):
+            raise HTTPException(status_code=400, detail=f"Request is already {req.status} and cannot be changed.")
+        stamp = utils.display_time(now)
+        if req.status == "NEW":
+            workflow.decide(session, req, action.approved, now, comment=comment)
+            if req.status == "IN_PROGRESS":
+                req.last_action = f"Admin override: Supervisor stage approved at {stamp}"
+            elif req.status == "APPROVED":
+                req.last_action = f"Admin override: Supervisor stage approved at {stamp}. No further approvers – request fully approved."
             else:
-                req.status = "APPROVED"
-                req.last_action = f"Admin override: Supervisor stage approved at {current_time.strftime('%d-%m-%Y %H:%M')}. No further approvers – request fully approved."
-        else:
-            req.status = "REJECTED"
-            req.last_action = f"Admin override: Supervisor stage rejected at {current_time.strftime('%d-%m-%Y %H:%M')}"
-        crud.update_request(db, req)
-        return utils.to_request_response(db, req)
-    if req.status == "IN_PROGRESS":
-        if req.current_approver_index >= len(req.approvers):
+                req.last_action = f"Admin override: Supervisor stage rejected at {stamp}"
+            return
+        if req.status != "IN_PROGRESS":
+            raise HTTPException(status_code=400, detail="Request cannot be partially approved in its current state.")
+        if workflow.pending_approver(req) is None:
             raise HTTPException(status_code=400, detail="No pending approver action for this request.")
-        current_approver_id = req.approvers[req.current_approver_index]
-        existing_action = crud.get_approver_action(db, req.id, current_approver_id)
-        if existing_action:
-            raise HTTPException(status_code=400, detail="Approver has already taken action on this stage.")
-        new_action = {
-            "request_id": req.id,
-            "approver_id": current_approver_id,
-            "approved": "APPROVED" if action.approved else "REJECTED",
-            "received_at": current_time.strftime("%d-%m-%Y %H:%M"),
-            "action_time": current_time.strftime("%d-%m-%Y %H:%M"),
-            "comment": f"[Admin Override] {action.comment or ''}".strip()
-        }
-        crud.create_approver_action(db, new_action)
-        if action.approved:
-            req.current_approver_index += 1
-            if req.current_approver_index >= len(req.approvers):
-                req.status = "APPROVED"
-                req.last_action = f"Admin override: Final stage approved at {current_time.strftime('%d-%m-%Y %H:%M')}."
-            else:
-                next_approver = req.approvers[req.current_approver_index]
-                req.status = "IN_PROGRESS"
-                req.last_action = f"Admin override: stage advanced at {current_time.strftime('%d-%m-%Y %H:%M')}. Next approver: {next_approver}"
+        workflow.decide(session, req, action.approved, now, comment=comment)
+        if req.status == "REJECTED":
+            req.last_action = f"Admin override: Rejected at {stamp}."
+        elif req.status == "APPROVED":
+            req.last_action = f"Admin override: Final stage approved at {stamp}."
         else:
-            req.status = "REJECTED"
-            req.last_action = f"Admin override: Rejected at {current_time.strftime('%d-%m-%Y %H:%M')}."
-        req.updated_at = current_time
-        crud.update_request(db, req)
-        return utils.to_request_response(db, req)
-    raise HTTPException(status_code=400, detail="Request cannot be partially approved in its current state.")
+            req.last_action = f"Admin override: stage advanced at {stamp}. Next approver: {workflow.pending_approver(req)}"
+
+    req = workflow.apply(db, action.request_id, stage_approve, "Approver has already taken action on this stage.", workflow.requested_stage(action))
+    if req is None:
+        raise HTTPException(status_code=404, detail="Request not found")
+    return TrustedJSONResponse(utils.to_request_response(db, req))
 
 @router.get("/all-requests", response_model=List[schemas.RequestResponse])
+@query_budget.limit(3)
 def admin_all_requests(current_user: models.User = Depends(lambda token=Depends(auth.oauth2_scheme), db=Depends(get_db): auth.get_current_user(token, db)), db: Session = Depends(get_db)):
     if not (2 in current_user.role or 3 in current_user.role):
         raise HTTPException(status_code=403, detail="Not authorized")
     all_requests = crud.list_all_requests(db)
-    responses = [utils.to_request_response(db, r) for r in all_requests]
-    return responses
+    query_budget.report_items(len(all_requests))
+    return TrustedJSONResponse(utils.to_request_responses(db, all_requests))
 
 @router.get("/admin/total-requests")
 def admin_total_requests(current_user: models.User = Depends(lambda token=Depends(auth.oauth2_scheme), db=Depends(get_db): auth.get_current_user(token, db)), db: Session = Depends(get_db)):
     if not (2 in current_user.role or 3 in current_user.role):
         raise HTTPException(status_code=403, detail="Not authorized")
-    total = len(crud.list_all_requests(db))
+    total = crud.count_requests(db)
     return {"total_requests": total}
 
 @router.get("/admin/pending-requests")
 def admin_pending_requests(current_user: models.User = Depends(lambda token=Depends(auth.oauth2_scheme), db=Depends(get_db): auth.get_current_user(token, db)), db: Session = Depends(get_db)):
     if not (2 in current_user.role or 3 in current_user.role):
         raise HTTPException(status_code=403, detail="Not authorized")
-    pending = [r for r in crud.list_all_requests(db) if r.status in ("NEW", "IN_PROGRESS")]
-    return {"total_pending_requests": len(pending)}
+    pending = crud.count_requests(db, statuses=("NEW", "IN_PROGRESS"))
+    return {"total_pending_requests": pending}
 
 @router.delete("/sessions/clear-all")
 def admin_clear_all_sessions(admin: models.User = Depends(get_admin_user), db: Session = Depends(get_db)):
     db.query(models.Token).delete()
     db.commit()
+    auth.invalidate_all_tokens()
     return {"detail": "Cleared all sessions for all active users."}
+
+@router.get("/counters/check")
+def admin_counters_check(admin: models.User = Depends(get_admin_user), db: Session = Depends(get_db)):
+    return counters.check(db)
+
+@router.post("/counters/rebuild")
+def admin_counters_rebuild(admin: models.User = Depends(get_admin_user), db: Session = Depends(get_db)):
+    counters.rebuild(db)
+    return counters.check(db)
+
+@router.get("/inbox/check")
+def admin_inbox_check(admin: models.User = Depends(get_admin_user), db: Session = Depends(get_db)):
+    return inbox.check(db)
+
+@router.post("/inbox/rebuild")
+def admin_inbox_rebuild(admin: models.User = Depends(get_admin_user), db: Session = Depends(get_db)):
+    inbox.rebuild(db)
+    return inbox.check(db)
+
+@router.get("/stats/pool")
+def admin_pool_stats(admin: models.User = Depends(get_admin_user)):
+    return database.pool_stats()
+
+@router.get("/stats/auth-cache")
+def admin_auth_cache_stats(admin: models.User = Depends(get_admin_user)):
+    return auth.principal_cache.stats()
+
+@router.get("/stats/password-hashing")
+def admin_password_hashing_stats(admin: models.User = Depends(get_admin_user)):
+    return passwords.stats()
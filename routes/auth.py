@@ -1,47 +1,61 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from typing import List
-import schemas, crud, auth, models
-from database import get_db
-from datetime import datetime
+import schemas, crud, auth, models, async_crud, passwords, utils
+from database import get_db, get_async_db
+from datetime import datetime, timezone
 
 router = APIRouter()
 oauth2_scheme = auth.oauth2_scheme  # re‐use our oauth2_scheme from auth.py
 
 @router.post("/register", response_model=schemas.UserResponse)
-def register_user(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
-    if crud.get_user_by_username(db, user_data.username):
+async def register_user(user_data: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    if await async_crud.get_user_by_username(db, user_data.username):
         raise HTTPException(status_code=400, detail="User with this username already exists.")
-    hashed_password = auth.get_password_hash(user_data.password)
-    new_user = crud.create_user(db, user_data, hashed_password)
+    hashed_password = await passwords.hash_password(user_data.password)
+    new_user = await async_crud.create_user(db, user_data, hashed_password)
+    await db.commit()
     return new_user
 
 @router.post("/login", response_model=schemas.Token)
-def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = crud.get_user_by_username(db, form_data.username)
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await async_crud.get_user_by_username(db, form_data.username)
+    if not user:
+        raise HTTPException(status_code=401, detail="Incorrect username or password")
+    valid, new_hash = await passwords.verify_and_update(form_data.password, user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=401, detail="Incorrect username or password")
+    if new_hash:
+        user.hashed_password = new_hash
+        await async_crud.update_user(db, user)
     access_token = auth.create_access_token(data={"sub": str(user.id)})
     client_ip = request.client.host if request.client else "Unknown"
     user_agent = request.headers.get("User-Agent", "Unknown")
     token_details = {
         "user_id": user.id,
-        "created_at": datetime.utcnow().isoformat(),
+        "created_at": datetime.now(timezone.utc),
+        "expires_at": auth.token_expiry(access_token),
         "ip_address": client_ip,
         "user_agent": user_agent
     }
-    crud.create_token(db, access_token, token_details)
+    await async_crud.create_token(db, auth.token_hash(access_token), token_details)
+    await db.commit()
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/logout")
 def logout(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    crud.remove_token(db, token)
+    crud.remove_token(db, auth.token_hash(token))
+    db.commit()
+    auth.invalidate_token(token)
     return {"detail": "Successfully logged out."}
 
 @router.post("/logout_all")
 def logout_all(current_user: models.User = Depends(lambda token=Depends(oauth2_scheme), db=Depends(get_db): auth.get_current_user(token, db)), db: Session = Depends(get_db)):
     crud.remove_tokens_by_user(db, current_user.id)
+    db.commit()
+    auth.invalidate_user(current_user.id)
     return {"detail": "Logged out from all sessions."}
 
 @router.get("/sessions", response_model=List[schemas.SessionInfo])
@@ -51,7 +65,7 @@ def list_sessions(current_user: models.User = Depends(lambda token=Depends(oauth
     for t in tokens:
         result.append({
             "session_id": t.token,
-            "login_time": t.created_at,
+            "login_time": utils.display_time(t.created_at),
             "ip_address": t.ip_address,
             "user_agent": t.user_agent
         })
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Body, Depends, HTTPException, status, UploadFile, File, Form, Request, Response, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime, timedelta
 import json, os
-import schemas, crud, models, auth, utils
-from database import get_db
-from starlette.responses import StreamingResponse
+import schemas, models, auth, utils, uploads, pdf_cache, async_crud, query_budget, workflow, list_cache
+from database import get_async_db
+from config import BULK_REVIEW_MAX_ITEMS
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse
+from serialization import TrustedJSONResponse
 router = APIRouter()
 
 @router.post("/requests/{request_id}/edit", response_model=schemas.RequestResponse)
@@ -21,10 +24,10 @@ async def edit_request(
     priority: str = Form(...),
     approvers: str = Form(...),
     files: Optional[List[UploadFile]] = File(None),
-    current_user: models.User = Depends(lambda token=Depends(auth.oauth2_scheme), db=Depends(get_db): auth.get_current_user(token, db)),
-    db: Session = Depends(get_db)
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    req = crud.get_request_by_id(db, request_id)
+    req = await async_crud.get_request_by_id(db, request_id)
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
     if req.status != "NEW":
@@ -49,102 +52,86 @@ async def edit_request(
     req.priority = priority
     req.approvers = approvers_list
     req.updated_at = current_time
-    req.last_action = f"Request edited at {current_time.strftime('%d-%m-%Y %H:%M')}"
-    crud.delete_approver_actions_by_request(db, req.id)
+    req.last_action = f"Request edited at {utils.display_time(current_time)}"
+    await async_crud.delete_approver_actions_by_request(db, req.id)
     if files:
-        if not req.files:
-            req.files = []
-        for file in files:
-            file.file.seek(0)
-            content = await file.read()
-            timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-            new_filename = f"{req.id}_{timestamp}"
-            ext = file.filename.split('.')[-1] if file.filename and '.' in file.filename else ''
-            if ext:
-                new_filename += f".{ext}"
-            file_location = os.path.join(utils.UPLOAD_FOLDER, new_filename)
-            with open(file_location, "wb") as f:
-                f.write(content)
-            file_record = {"file_url": f"/files/{new_filename}", "file_display_name": file.filename}
-            req.files.append(file_record)
-    crud.update_request(db, req)
-    response_data = utils.to_request_response(db, req)
-    return response_data
+        req.files = (req.files or []) + await uploads.save_request_files(db, files)
+    await async_crud.update_request(db, req)
+    await db.commit()
+    return TrustedJSONResponse(await db.run_sync(utils.to_request_response, req))
 
-@router.post("/requests/review", response_model=schemas.RequestResponse)
-async def review_request(action: schemas.ApprovalAction, current_user: models.User = Depends(lambda token=Depends(auth.oauth2_scheme), db=Depends(get_db): auth.get_current_user(token, db)), db: Session = Depends(get_db)):
-    req = crud.get_request_by_id(db, action.request_id)
-    if not req:
-        raise HTTPException(status_code=404, detail="Request not found.")
-    if req.status in ("APPROVED", "REJECTED"):
-        raise HTTPException(status_code=400, detail=f"Request is already {req.status} and cannot be changed.")
-    current_time = datetime.utcnow()
-    if req.status == "NEW":
-        if current_user.id != req.supervisor_id and not (2 in current_user.role or 3 in current_user.role):
-            raise HTTPException(status_code=403, detail="Not authorized to approve/reject at supervisor stage.")
-        req.supervisor_approved = action.approved
-        req.supervisor_comment = action.comment
-        req.supervisor_approved_at = current_time
-        req.updated_at = current_time
-        if action.approved:
-            if req.approvers:
-                req.status = "IN_PROGRESS"
-                req.last_action = f"Supervisor approved at {current_time.strftime('%d-%m-%Y %H:%M')}"
-                req.current_approver_index = 0
+def _review_step(current_user: models.User, action: schemas.ApprovalAction):
+    """Workflow step applying action on behalf of current_user (see workflow.apply)."""
+    is_admin = 2 in current_user.role or 3 in current_user.role
+
+    def review(session, req, now):
+        if req.status in ("APPROVED", "REJECTED"):
+            raise HTTPException(status_code=400, detail=f"Request is already {req.status} and cannot be changed.")
+        stamp = utils.display_time(now)
+        if req.status == "NEW":
+            if current_user.id != req.supervisor_id and not is_admin:
+                raise HTTPException(status_code=403, detail="Not authorized to approve/reject at supervisor stage.")
+            workflow.decide(session, req, action.approved, now, comment=action.comment)
+            if req.status == "IN_PROGRESS":
+                req.last_action = f"Supervisor approved at {stamp}"
+            elif req.status == "APPROVED":
+                req.last_action = f"Supervisor approved at {stamp}. No further approvers – request is fully approved."
             else:
-                req.status = "APPROVED"
-                req.last_action = f"Supervisor approved at {current_time.strftime('%d-%m-%Y %H:%M')}. No further approvers – request is fully approved."
-        else:
-            req.status = "REJECTED"
-            req.last_action = f"Supervisor rejected at {current_time.strftime('%d-%m-%Y %H:%M')}"
-        crud.update_request(db, req)
-        return utils.to_request_response(db, req)
-    if req.status == "IN_PROGRESS":
-        if req.current_approver_index >= len(req.approvers):
+                req.last_action = f"Supervisor rejected at {stamp}"
+            return
+        if req.status != "IN_PROGRESS":
+            raise HTTPException(status_code=400, detail="Request cannot be approved or rejected in its current state.")
+        expected_approver_id = workflow.pending_approver(req)
+        if expected_approver_id is None:
             raise HTTPException(status_code=400, detail="No further approver action is pending for this request.")
-        expected_approver_id = req.approvers[req.current_approver_index]
-        if current_user.id != expected_approver_id and not (2 in current_user.role or 3 in current_user.role):
+        if current_user.id != expected_approver_id and not is_admin:
             raise HTTPException(status_code=403, detail="Not authorized to approve this pending stage.")
-        existing_action = crud.get_approver_action(db, req.id, expected_approver_id)
-        if existing_action:
-            raise HTTPException(status_code=400, detail="You have already taken action on this request.")
-        if (2 in current_user.role or 3 in current_user.role) and current_user.id != expected_approver_id:
-            new_action = {
-                "request_id": req.id,
-                "approver_id": current_user.id,
-                "approved": "APPROVED" if action.approved else "REJECTED",
-                "received_at": current_time.strftime("%d-%m-%Y %H:%M"),
-                "action_time": current_time.strftime("%d-%m-%Y %H:%M"),
-                "comment": action.comment,
-                "approved_by": current_user.name
-            }
-            req.last_action = f"Approved by {current_user.name} at {current_time.strftime('%d-%m-%Y %H:%M')}"
+        if is_admin and current_user.id != expected_approver_id:
+            # Recorded against the stage's approver; approved_by names the admin.
+            approved_by = current_user.name
+            last_action = f"Approved by {current_user.name} at {stamp}"
         else:
-            new_action = {
-                "request_id": req.id,
-                "approver_id": expected_approver_id,
-                "approved": "APPROVED" if action.approved else "REJECTED",
-                "received_at": current_time.strftime("%d-%m-%Y %H:%M"),
-                "action_time": current_time.strftime("%d-%m-%Y %H:%M"),
-                "comment": action.comment
-            }
-            req.last_action = f"Approver {expected_approver_id} approved at {current_time.strftime('%d-%m-%Y %H:%M')}"
-        crud.create_approver_action(db, new_action)
-        req.updated_at = current_time
-        if action.approved:
-            req.current_approver_index += 1
-            if req.current_approver_index >= len(req.approvers):
-                req.status = "APPROVED"
-                req.last_action += ". All approvals are completed."
-            else:
-                next_approver_id = req.approvers[req.current_approver_index]
-                req.last_action += f". Next approver is user {next_approver_id}."
+            approved_by = None
+            last_action = f"Approver {expected_approver_id} approved at {stamp}"
+        workflow.decide(session, req, action.approved, now, comment=action.comment, approved_by=approved_by)
+        if req.status == "REJECTED":
+            req.last_action = f"Approver action rejected at {stamp}"
+        elif req.status == "APPROVED":
+            req.last_action = last_action + ". All approvals are completed."
         else:
-            req.status = "REJECTED"
-            req.last_action = f"Approver action rejected at {current_time.strftime('%d-%m-%Y %H:%M')}"
-        crud.update_request(db, req)
-        return utils.to_request_response(db, req)
-    raise HTTPException(status_code=400, detail="Request cannot be approved or rejected in its current state.")
+            req.last_action = last_action + f". Next approver is user {workflow.pending_approver(req)}."
+
+    return review
+
+@router.post("/requests/review", response_model=schemas.RequestResponse)
+@query_budget.limit(8)
+async def review_request(action: schemas.ApprovalAction, current_user: models.User = Depends(auth.get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    req = await db.run_sync(workflow.apply, action.request_id, _review_step(current_user, action), "You have already taken action on this request.", workflow.requested_stage(action))
+    if req is None:
+        raise HTTPException(status_code=404, detail="Request not found.")
+    return TrustedJSONResponse(await db.run_sync(utils.to_request_response, req))
+
+@router.post("/requests/review/bulk", response_model=List[schemas.BulkReviewResult])
+@query_budget.limit(8, per_item=1)
+async def bulk_review_requests(
+    actions: List[schemas.ApprovalAction] = Body(..., max_length=BULK_REVIEW_MAX_ITEMS),
+    include_requests: bool = False,
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    steps = [(action.request_id, _review_step(current_user, action), workflow.requested_stage(action)) for action in actions]
+    outcomes = await db.run_sync(workflow.apply_many, steps, "You have already taken action on this request.")
+    results = [
+        {"request_id": action.request_id, "status_code": code, "detail": detail, "status": req.status if req else None}
+        for action, (req, code, detail) in zip(actions, outcomes)
+    ]
+    if include_requests:
+        # Hydrated only when asked for, in one batch for all decided items.
+        decided = [(result, req) for result, (req, _, _) in zip(results, outcomes) if req is not None]
+        responses = await db.run_sync(utils.to_request_responses, [req for _, req in decided])
+        for (result, _), response in zip(decided, responses):
+            result["request"] = response
+    return results
 
 @router.post("/requests/", response_model=schemas.RequestResponse)
 async def create_new_request(
@@ -159,10 +146,8 @@ async def create_new_request(
     priority: str = Form("Low"),
     approvers: str = Form(...),
     files: Optional[List[UploadFile]] = File(None),
-    current_user: models.User = Depends(
-        lambda token=Depends(auth.oauth2_scheme), db=Depends(get_db): auth.get_current_user(token, db)
-    ),
-    db: Session = Depends(get_db)
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create (raise) a brand-new NFA request.
@@ -197,115 +182,124 @@ async def create_new_request(
         "status": "NEW",
         "created_at": current_time,
         "updated_at": current_time,
-        "last_action": f"Request created at {current_time.strftime('%d-%m-%Y %H:%M')}",
+        "last_action": f"Request created at {utils.display_time(current_time)}",
     }
 
-    # 3) Create the request in DB
-    new_req = crud.create_request(db, new_req_data)
-
-    # 4) Handle files (if any)
+    # 3) Store the files (if any) so the request is inserted with them
     if files:
-        file_records = []
-        for file in files:
-            file.file.seek(0)
-            content = await file.read()
-            timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-            new_filename = f"{new_req.id}_{timestamp}"
-            ext = ""
-            if file.filename and "." in file.filename:
-                ext = file.filename.split(".")[-1]
-            if ext:
-                new_filename += f".{ext}"
-
-            file_location = os.path.join(utils.UPLOAD_FOLDER, new_filename)
-            with open(file_location, "wb") as f:
-                f.write(content)
-
-            file_record = {
-                "file_url": f"/files/{new_filename}",
-                "file_display_name": file.filename
-            }
-            file_records.append(file_record)
+        new_req_data["files"] = await uploads.save_request_files(db, files)
 
-        new_req.files = file_records
-        crud.update_request(db, new_req)
+    # 4) Create the request in DB
+    new_req = await async_crud.create_request(db, new_req_data)
+    await db.commit()
 
     # 5) Return the newly created request as a response
-    return utils.to_request_response(db, new_req)
+    return TrustedJSONResponse(await db.run_sync(utils.to_request_response, new_req))
 
 
 @router.get("/requests/", response_model=List[schemas.RequestResponse])
+@query_budget.limit(4)
 async def list_requests(
+    request: Request,
     note_id: Optional[int] = None,
     date: Optional[str] = None,
     initiator: Optional[str] = None,
     filter: Optional[str] = None,
-    current_user: models.User = Depends(lambda token=Depends(auth.oauth2_scheme), db=Depends(get_db): auth.get_current_user(token, db)),
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    all_requests = crud.list_all_requests(db)
-    if note_id:
-        all_requests = [r for r in all_requests if r.id == note_id]
+    created_from = created_to = None
     if date:
         try:
-            date_obj = datetime.strptime(date, "%Y-%m-%d")
-            next_day = date_obj + timedelta(days=1)
-            def within_date(r):
-                return date_obj <= r.created_at < next_day
-            all_requests = [r for r in all_requests if within_date(r)]
+            # An IST calendar day; created_at is stored in UTC.
+            created_from = datetime.strptime(date, "%Y-%m-%d") - utils.IST.utcoffset(None)
+            created_to = created_from + timedelta(days=1)
         except ValueError:
             raise HTTPException(status_code=400, detail="Date must be in YYYY-MM-DD format")
-    if initiator:
-        def match_initiator(r):
-            user_ = crud.get_user_by_id(db, r.initiator_id)
-            return user_ and initiator.lower() in user_.name.lower()
-        all_requests = [r for r in all_requests if match_initiator(r)]
+    statuses = None
     if filter:
         f = filter.upper()
         if f == "PENDING":
-            all_requests = [r for r in all_requests if r.status in ("NEW", "IN_PROGRESS")]
+            statuses = ("NEW", "IN_PROGRESS")
         elif f == "APPROVED":
-            all_requests = [r for r in all_requests if r.status == "APPROVED"]
-    visible = []
-    for r in all_requests:
-        if (current_user.id == r.initiator_id or current_user.id == r.supervisor_id or 
-            (r.status in ("APPROVED", "REJECTED") and current_user.id in r.approvers) or 
-            (r.status == "IN_PROGRESS" and r.current_approver_index < len(r.approvers) and current_user.id == r.approvers[r.current_approver_index])):
-            visible.append(r)
-    responses = [utils.to_request_response(db, r) for r in visible]
-    return responses
-from pydantic import BaseModel
-from typing import List
+            statuses = ("APPROVED",)
+    after = utils.decode_cursor(cursor) if cursor else None
+    filters = dict(
+        note_id=note_id,
+        created_from=created_from,
+        created_to=created_to,
+        initiator_name=initiator,
+        statuses=statuses,
+        after=after
+    )
+    tag = list_cache.etag(request, current_user.id, *await async_crud.requests_version(db, current_user.id, **filters))
+    hit = list_cache.cached(request, tag)
+    if hit is not None:
+        return hit
+    visible = await async_crud.list_requests_for_user(db, current_user.id, limit=limit, **filters)
+    # Clients page by passing the X-Next-Cursor value back as ?cursor=.
+    headers = {}
+    if limit and len(visible) == limit:
+        headers["X-Next-Cursor"] = utils.encode_cursor(visible[-1])
+    query_budget.report_items(len(visible))
+    responses = await db.run_sync(utils.to_request_responses, visible)
+    return list_cache.render(tag, responses, headers)
 
-class RequestEditDetails(BaseModel):
-    description: str
-    tower: str
-    department: str
-    references: str
-    area: str
-    subject: str
-    priority: str
-    project: str
-    supervisor_id: int
-    approvers: List[int]
-    files: List = []  # Always returns an empty array
+@router.get("/requests/search", response_model=List[schemas.RequestResponse])
+@query_budget.limit(3)
+async def search_requests(
+    q: Optional[str] = Query(None, min_length=1, max_length=200),
+    initiator: Optional[str] = Query(None, min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if not (q or initiator):
+        raise HTTPException(status_code=400, detail="Provide a search text (q) or an initiator name")
+    after = utils.decode_search_cursor(cursor) if cursor else None
+    rows = await async_crud.search_requests(db, current_user.id, text=q, initiator_name=initiator, limit=limit, after=after)
+    # Best matches first; page on by passing the X-Next-Cursor value back as ?cursor=.
+    headers = {}
+    if len(rows) == limit:
+        last, rank = rows[-1]
+        headers["X-Next-Cursor"] = utils.encode_search_cursor(rank, last.id)
+    query_budget.report_items(len(rows))
+    return TrustedJSONResponse(await db.run_sync(utils.to_request_responses, [req for req, _ in rows]), headers=headers)
 
-@app.get("/requests/{request_id}", response_model=RequestEditDetails)
-async def get_request_edit_details(request_id: int, current_user: dict = Depends(get_current_user)):
-    req = get_request_by_id(request_id)
+@router.get("/requests/inbox", response_model=List[schemas.RequestResponse])
+@query_budget.limit(3)
+async def list_inbox(
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    pending = await async_crud.list_pending_requests(db, current_user.id, limit)
+    query_budget.report_items(len(pending))
+    return TrustedJSONResponse(await db.run_sync(utils.to_request_responses, pending))
+
+@router.get("/requests/{request_id}", response_model=schemas.RequestEditDetails)
+async def get_request_edit_details(
+    request_id: int,
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    req = await async_crud.get_request_by_id(db, request_id)
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
-    return RequestEditDetails(
-        description=req.get("description") or "",
-        tower=req.get("tower") or "",
-        department=req.get("department") or "",
-        references=req.get("references") or "",
-        area=req.get("area") or "",
-        subject=req.get("subject") or "",
-        priority=req.get("priority") or "",
-        project=req.get("project") or "",
-        supervisor_id=req.get("supervisor_id") or 0,
-        approvers=req.get("approvers") or [],
+    return schemas.RequestEditDetails(
+        description=req.description or "",
+        tower=req.tower or "",
+        department=req.department or "",
+        references=req.references or "",
+        area=req.area or "",
+        subject=req.subject or "",
+        priority=req.priority or "",
+        project=req.project or "",
+        supervisor_id=req.supervisor_id or 0,
+        approvers=req.approvers or [],
         files=[]  # Always return an empty array
     )
 
@@ -315,7 +309,7 @@ async def download_pdf(
     request_id: int,
     request: Request,
     access_token: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     # 1) Extract token
     token = access_token
@@ -327,10 +321,10 @@ async def download_pdf(
         raise HTTPException(status_code=401, detail="Not authenticated")
 
     # 2) Verify current user
-    current_user = auth.get_current_user(token, db)
+    current_user = await auth.get_current_user_async(token, db)
 
     # 3) Find the request
-    req = crud.get_request_by_id(db, request_id)
+    req = await async_crud.get_request_by_id(db, request_id)
     if not req:
         raise HTTPException(status_code=404, detail="NFA not found")
 
@@ -348,18 +342,30 @@ async def download_pdf(
             detail="Not authorized to download this PDF"
         )
 
-    # 6) Generate or retrieve the PDF
-    pdf_buffer = utils.generate_pdf(db, req)  # expects a BytesIO
+    # 6) Answer conditional requests without touching the PDF at all
+    cache_headers = {
+        "ETag": pdf_cache.etag(req),
+        "Last-Modified": pdf_cache.last_modified(req),
+        "Cache-Control": "private, no-cache",
+    }
+    if pdf_cache.is_not_modified(req, request.headers.get("If-None-Match"), request.headers.get("If-Modified-Since")):
+        return Response(status_code=304, headers=cache_headers)
 
-    # IMPORTANT: reset pointer before streaming
-    pdf_buffer.seek(0)
+    # 7) Serve the cached rendering, rendering it off the event loop on a miss
+    pdf_path = await run_in_threadpool(pdf_cache.cached_pdf_path, req)
+    if pdf_path is None:
+        names = {u.id: u.name for u in await async_crud.get_users_by_ids(db, [req.initiator_id, req.supervisor_id])}
+        pdf_path = await run_in_threadpool(
+            pdf_cache.store_pdf, req, names.get(req.initiator_id, "NA"), names.get(req.supervisor_id, "NA")
+        )
 
-    # 7) Return as an attachment for better cross-platform support
-    return StreamingResponse(
-        pdf_buffer,
+    # 8) Return as an attachment for better cross-platform support
+    return FileResponse(
+        pdf_path,
         media_type="application/pdf",
         headers={
-            "Content-Disposition": f'attachment; filename="nfa_{req.id}.pdf"'
+            "Content-Disposition": f'attachment; filename="nfa_{req.id}.pdf"',
+            **cache_headers
         },
     )
 
@@ -367,39 +373,19 @@ async def download_pdf(
 async def upload_files_for_request(
     request_id: int,
     files: Optional[List[UploadFile]] = File(None),
-    current_user: models.User = Depends(lambda token=Depends(auth.oauth2_scheme), db=Depends(get_db): auth.get_current_user(token, db)),
-    db: Session = Depends(get_db)
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     if not files:
         raise HTTPException(status_code=400, detail="No files provided")
-    req = crud.get_request_by_id(db, request_id)
+    req = await async_crud.get_request_by_id(db, request_id)
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
     if req.initiator_id != current_user.id and 2 not in current_user.role:
         raise HTTPException(status_code=403, detail="Not authorized to upload files for this request")
-    file_records = req.files if req.files else []
-    for file in files:
-        original_filename = file.filename or "unnamed_file"
-        sanitized_filename = original_filename.replace(" ", "_")
-        ext = sanitized_filename.split('.')[-1].lower() if '.' in sanitized_filename else ''
-        subfolder = "others"
-        if ext == "pdf":
-            subfolder = "pdf"
-        elif ext in ["jpg", "jpeg", "png", "gif", "bmp"]:
-            subfolder = "image"
-        subfolder_path = os.path.join(utils.UPLOAD_FOLDER, subfolder)
-        os.makedirs(subfolder_path, exist_ok=True)
-        timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-        new_filename = f"{request_id}_{timestamp}_{sanitized_filename}"
-        file_location = os.path.join(subfolder_path, new_filename)
-        file.file.seek(0)
-        content = await file.read()
-        with open(file_location, "wb") as f:
-            f.write(content)
-        file_record = {"file_url": f"/files/{subfolder}/{new_filename}", "file_display_name": original_filename}
-        file_records.append(file_record)
-    req.files = file_records
-    crud.update_request(db, req)
+    req.files = (req.files or []) + await uploads.save_request_files(db, files)
+    await async_crud.update_request(db, req)
+    await db.commit()
     return {"files": req.files}
 
 @router.post("/requests/reinitiate", response_model=schemas.RequestResponse)
@@ -416,10 +402,10 @@ async def reinitiate_request(
     priority: Optional[str] = Form(None),
     approvers: Optional[str] = Form(None),
     files: Optional[List[UploadFile]] = File(None),
-    current_user: models.User = Depends(lambda token=Depends(auth.oauth2_scheme), db=Depends(get_db): auth.get_current_user(token, db)),
-    db: Session = Depends(get_db)
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    req = crud.get_request_by_id(db, request_id)
+    req = await async_crud.get_request_by_id(db, request_id)
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
     if req.initiator_id != current_user.id:
@@ -451,27 +437,14 @@ async def reinitiate_request(
         req.supervisor_approved = None
         req.supervisor_approved_at = None
         req.supervisor_comment = None
-        req.last_action = f"Request re-initiated at {current_time.strftime('%d-%m-%Y %H:%M')}"
-        crud.delete_approver_actions_by_request(db, req.id)
+        req.last_action = f"Request re-initiated at {utils.display_time(current_time)}"
+        await async_crud.delete_approver_actions_by_request(db, req.id)
         if files:
-            if not req.files:
-                req.files = []
-            for file in files:
-                file.file.seek(0)
-                content = await file.read()
-                timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-                new_filename = f"{req.id}_{timestamp}"
-                ext = file.filename.split('.')[-1] if file.filename and '.' in file.filename else ''
-                if ext:
-                    new_filename += f".{ext}"
-                file_location = os.path.join(utils.UPLOAD_FOLDER, new_filename)
-                with open(file_location, "wb") as f:
-                    f.write(content)
-                file_record = {"file_url": f"/files/{new_filename}", "file_display_name": file.filename}
-                req.files.append(file_record)
+            req.files = (req.files or []) + await uploads.save_request_files(db, files)
         req.updated_at = current_time
-        crud.update_request(db, req)
-        return utils.to_request_response(db, req)
+        await async_crud.update_request(db, req)
+        await db.commit()
+        return TrustedJSONResponse(await db.run_sync(utils.to_request_response, req))
     else:
         new_req_data = {
             "initiator_id": req.initiator_id,
@@ -489,7 +462,7 @@ async def reinitiate_request(
             "status": "NEW",
             "created_at": current_time,
             "updated_at": current_time,
-            "last_action": f"Request re-initiated at {current_time.strftime('%d-%m-%Y %H:%M')}",
+            "last_action": f"Request re-initiated at {utils.display_time(current_time)}",
             "supervisor_approved_at": None,
             "supervisor_approved": None,
             "supervisor_comment": None,
@@ -512,33 +485,21 @@ async def reinitiate_request(
             new_req_data["references"] = references
             new_req_data["priority"] = priority
             new_req_data["approvers"] = approvers_list
-        new_req = crud.create_request(db, new_req_data)
         if files:
-            file_records = []
-            for file in files:
-                file.file.seek(0)
-                content = await file.read()
-                timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-                new_filename = f"{new_req.id}_{timestamp}"
-                ext = file.filename.split('.')[-1] if file.filename and '.' in file.filename else ''
-                if ext:
-                    new_filename += f".{ext}"
-                file_location = os.path.join(utils.UPLOAD_FOLDER, new_filename)
-                with open(file_location, "wb") as f:
-                    f.write(content)
-                file_record = {"file_url": f"/files/{new_filename}", "file_display_name": file.filename}
-                file_records.append(file_record)
-            new_req.files = file_records
-            crud.update_request(db, new_req)
-        return utils.to_request_response(db, new_req)
+            new_req_data["files"] = await uploads.save_request_files(db, files)
+        new_req = await async_crud.create_request(db, new_req_data)
+        await db.commit()
+        return TrustedJSONResponse(await db.run_sync(utils.to_request_response, new_req))
 
 @router.delete("/requests/{request_id}/withdraw")
-async def withdraw_request(request_id: int, current_user: models.User = Depends(lambda token=Depends(auth.oauth2_scheme), db=Depends(get_db): auth.get_current_user(token, db)), db: Session = Depends(get_db)):
-    req = crud.get_request_by_id(db, request_id)
+async def withdraw_request(request_id: int, current_user: models.User = Depends(auth.get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    req = await async_crud.get_request_by_id(db, request_id)
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
     if req.status != "NEW":
         raise HTTPException(status_code=400, detail="Only NEW requests can be withdrawn")
-    db.delete(req)
-    db.commit()
+    orphaned = await db.run_sync(uploads.release_file_records, req.files or [])
+    await db.delete(req)
+    await db.commit()
+    await db.run_sync(uploads.remove_orphaned_blobs, orphaned)
     return {"detail": "NFA withdrawn successfully"}
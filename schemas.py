@@ -62,10 +62,35 @@ class RequestResponse(BaseModel):
     class Config:
         orm_mode = True
 
+class RequestEditDetails(BaseModel):
+    description: str
+    tower: str
+    department: str
+    references: str
+    area: str
+    subject: str
+    priority: str
+    project: str
+    supervisor_id: int
+    approvers: List[int]
+    files: List = []  # Always returns an empty array
+
 class ApprovalAction(BaseModel):
     request_id: int
     approved: bool
     comment: Optional[str] = None
+    # The stage decided on, as read from the request (status and, while
+    # IN_PROGRESS, current_approver_index); a request that has moved on since
+    # is answered 409.
+    status: Optional[str] = None
+    current_approver_index: Optional[int] = None
+
+class BulkReviewResult(BaseModel):
+    request_id: int
+    status_code: int  # what POST /requests/review would have answered
+    detail: Optional[str] = None
+    status: Optional[str] = None
+    request: Optional[RequestResponse] = None
 
 class SessionInfo(BaseModel):
     session_id: str
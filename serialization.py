@@ -0,0 +1,17 @@
+import orjson
+from fastapi.responses import Response
+
+# Request payloads are built server-side by utils.to_request_responses with
+# exactly the response schema's fields, so validating them again against
+# response_model only costs time. Routes return them through
+# TrustedJSONResponse instead, which encodes with orjson; response_model stays
+# on the route for the OpenAPI schema.
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content)
+
+class TrustedJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
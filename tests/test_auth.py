@@ -0,0 +1,72 @@
+"""The principal cache behind get_current_user, and when it is invalidated."""
+import pytest
+from sqlalchemy import select
+
+import auth, models
+
+@pytest.fixture
+def login(client, db):
+    def login(user, password="secret"):
+        user.hashed_password = auth.get_password_hash(password)
+        db.commit()
+        response = client.post("/login", data={"username": user.username, "password": password})
+        assert response.status_code == 200
+        return response.json()["access_token"]
+    return login
+
+def _bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+def test_principal_is_served_from_the_cache(client, make_user, auth_headers):
+    user = make_user("user")
+    headers = auth_headers(user)
+    hits, misses = auth.principal_cache.hits, auth.principal_cache.misses
+    for _ in range(3):
+        assert client.get("/users/me", headers=headers).json()["username"] == "user"
+    assert auth.principal_cache.misses - misses == 1
+    assert auth.principal_cache.hits - hits == 2
+
+def test_logout_drops_the_session_and_the_cached_principal(client, db, make_user, login):
+    user = make_user("user")
+    token = login(user)
+    assert client.get("/users/me", headers=_bearer(token)).status_code == 200
+    assert auth.principal_cache.get(token) is not None
+
+    assert client.post("/logout", headers=_bearer(token)).status_code == 200
+    assert auth.principal_cache.get(token) is None
+    db.expire_all()
+    assert db.scalar(select(models.Token).where(models.Token.token == auth.token_hash(token))) is None
+
+def test_logout_all_drops_every_cached_session_of_the_user(client, make_user, login, auth_headers):
+    user, other = make_user("user"), make_user("other")
+    tokens = [login(user), login(user)]
+    other_headers = auth_headers(other)
+    for headers in [_bearer(token) for token in tokens] + [other_headers]:
+        assert client.get("/users/me", headers=headers).status_code == 200
+
+    assert client.post("/logout_all", headers=_bearer(tokens[0])).status_code == 200
+    assert all(auth.principal_cache.get(token) is None for token in tokens)
+    assert auth.principal_cache.get(other_headers["Authorization"].split()[1]) is not None
+
+def test_admin_edit_is_seen_by_the_next_request(client, make_user, auth_headers):
+    admin, user = make_user("admin", role=(0, 2)), make_user("user")
+    headers = auth_headers(user)
+    assert client.get("/users/me", headers=headers).json()["name"] == "User"
+
+    edit = {"name": "Renamed", "role": [0, 1]}
+    assert client.put(f"/admin/users/{user.id}", json=edit, headers=auth_headers(admin)).status_code == 200
+    me = client.get("/users/me", headers=headers).json()
+    assert (me["name"], me["role"]) == ("Renamed", [0, 1])
+
+def test_deleted_user_is_refused_at_once(client, make_user, auth_headers):
+    admin, user = make_user("admin", role=(0, 2)), make_user("user")
+    headers = auth_headers(user)
+    assert client.get("/users/me", headers=headers).status_code == 200
+    assert client.delete(f"/admin/users/{user.id}", headers=auth_headers(admin)).status_code == 200
+    assert client.get("/users/me", headers=headers).status_code == 401
+
+def test_clearing_all_sessions_empties_the_cache(client, make_user, auth_headers):
+    admin, user = make_user("admin", role=(0, 2)), make_user("user")
+    assert client.get("/users/me", headers=auth_headers(user)).status_code == 200
+    assert client.delete("/admin/sessions/clear-all", headers=auth_headers(admin)).status_code == 200
+    assert auth.principal_cache.stats()["entries"] == 0
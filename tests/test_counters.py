@@ -0,0 +1,61 @@
+"""request_counters: the flush hook, the SQL counts read from it, and drift repair."""
+import pytest
+from sqlalchemy import select, update
+
+import counters, crud, models
+
+def _counts(db):
+    table = models.RequestCounter.__table__
+    db.expire_all()
+    return {(i, s): c for i, s, c in db.execute(select(table.c.initiator_id, table.c.status, table.c.count)) if c}
+
+def _create(client, headers, supervisor):
+    form = {
+        "supervisor_id": supervisor.id, "subject": "S", "description": "D", "area": "A", "project": "P",
+        "tower": "T", "department": "D", "approvers": "[]",
+    }
+    response = client.post("/requests/", data=form, headers=headers)
+    assert response.status_code == 200
+    return response.json()["id"]
+
+def test_hook_follows_create_review_and_withdraw(client, db, make_user, auth_headers):
+    initiator, supervisor = make_user("initiator"), make_user("supervisor")
+    first = _create(client, auth_headers(initiator), supervisor)
+    second = _create(client, auth_headers(initiator), supervisor)
+    assert _counts(db) == {(initiator.id, "NEW"): 2}
+
+    review = {"request_id": first, "approved": True}
+    assert client.post("/requests/review", json=review, headers=auth_headers(supervisor)).status_code == 200
+    assert _counts(db) == {(initiator.id, "NEW"): 1, (initiator.id, "APPROVED"): 1}
+
+    assert client.delete(f"/requests/{second}/withdraw", headers=auth_headers(initiator)).status_code == 200
+    assert _counts(db) == {(initiator.id, "APPROVED"): 1}
+    assert counters.check(db)["consistent"]
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_counts_agree_with_or_without_the_table(db, make_user, make_request, monkeypatch, enabled):
+    monkeypatch.setattr(crud, "REQUEST_COUNTERS_ENABLED", enabled)
+    supervisor = make_user("supervisor")
+    a, b = make_user("a"), make_user("b")
+    make_request(a, supervisor)
+    make_request(a, supervisor, status="APPROVED")
+    make_request(b, supervisor, status="IN_PROGRESS")
+    assert crud.count_requests(db) == 3
+    assert crud.count_requests(db, statuses=("NEW", "IN_PROGRESS")) == 2
+    assert crud.count_requests_by_initiator(db) == {a.id: 2, b.id: 1}
+
+def test_check_reports_drift_and_rebuild_repairs_it(client, db, make_user, make_request, auth_headers):
+    admin = make_user("admin", role=(0, 2))
+    req = make_request(make_user("initiator"), admin)
+    # Written behind the hook's back, as a raw UPDATE or a restored backup would.
+    db.execute(update(models.RequestCounter).values(count=5))
+    db.execute(update(models.Request).where(models.Request.id == req.id).values(status="APPROVED"))
+    db.commit()
+
+    report = client.get("/admin/counters/check", headers=auth_headers(admin)).json()
+    assert not report["consistent"]
+    assert report["missing"] == [{"initiator_id": req.initiator_id, "status": "APPROVED", "count": 1}]
+    assert report["unexpected"] == [{"initiator_id": req.initiator_id, "status": "NEW", "count": 5}]
+
+    assert client.post("/admin/counters/rebuild", headers=auth_headers(admin)).json()["consistent"]
+    assert _counts(db) == {(req.initiator_id, "APPROVED"): 1}
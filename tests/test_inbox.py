@@ -0,0 +1,74 @@
+"""pending_assignments: the flush hook behind /requests/inbox, and drift repair."""
+from sqlalchemy import select
+
+import inbox, models
+
+def _assignments(db):
+    table = models.PendingAssignment.__table__
+    db.expire_all()
+    return set(db.execute(select(table.c.request_id, table.c.user_id, table.c.stage)))
+
+def _inbox(client, headers):
+    response = client.get("/requests/inbox", headers=headers)
+    assert response.status_code == 200
+    return [item["id"] for item in response.json()]
+
+def test_inbox_follows_the_pending_stage(client, db, make_user, make_request, auth_headers):
+    initiator, supervisor = make_user("initiator"), make_user("supervisor")
+    first, second = make_user("approver_0"), make_user("approver_1")
+    req = make_request(initiator, supervisor, [first, second])
+    assert _assignments(db) == {(req.id, supervisor.id, 0)}
+    assert _inbox(client, auth_headers(supervisor)) == [req.id]
+
+    for reviewer, pending in ((supervisor, (first, 1)), (first, (second, 2))):
+        review = {"request_id": req.id, "approved": True}
+        assert client.post("/requests/review", json=review, headers=auth_headers(reviewer)).status_code == 200
+        assert _assignments(db) == {(req.id, pending[0].id, pending[1])}
+        assert _inbox(client, auth_headers(reviewer)) == []
+        assert _inbox(client, auth_headers(pending[0])) == [req.id]
+
+    review = {"request_id": req.id, "approved": False}
+    assert client.post("/requests/review", json=review, headers=auth_headers(second)).status_code == 200
+    assert _assignments(db) == set()
+
+    # Re-initiating sends it back to the supervisor.
+    response = client.post("/requests/reinitiate", params={"request_id": req.id}, data={"edit_details": "false"}, headers=auth_headers(initiator))
+    assert response.status_code == 200
+    assert _assignments(db) == {(response.json()["id"], supervisor.id, 0)}
+    assert inbox.check(db)["consistent"]
+
+def test_withdrawn_request_leaves_the_inbox(client, db, make_user, make_request, auth_headers):
+    initiator, supervisor = make_user("initiator"), make_user("supervisor")
+    req = make_request(initiator, supervisor)
+    assert client.delete(f"/requests/{req.id}/withdraw", headers=auth_headers(initiator)).status_code == 200
+    assert _assignments(db) == set()
+    assert _inbox(client, auth_headers(supervisor)) == []
+
+def test_check_reports_drift_and_rebuild_repairs_it(client, db, make_user, make_request, auth_headers):
+    admin = make_user("admin", role=(0, 2))
+    supervisor = make_user("supervisor")
+    req = make_request(make_user("initiator"), supervisor)
+    db.execute(models.PendingAssignment.__table__.update().values(user_id=admin.id))
+    db.commit()
+
+    report = client.get("/admin/inbox/check", headers=auth_headers(admin)).json()
+    assert not report["consistent"]
+    assert report["missing"] == [{"request_id": req.id, "user_id": supervisor.id, "stage": 0}]
+    assert report["unexpected"] == [{"request_id": req.id, "user_id": admin.id, "stage": 0}]
+
+    assert client.post("/admin/inbox/rebuild", headers=auth_headers(admin)).json()["consistent"]
+    assert _assignments(db) == {(req.id, supervisor.id, 0)}
+
+def test_ensure_seeded_fills_only_an_empty_table(db, make_user, make_request):
+    supervisor = make_user("supervisor")
+    req = make_request(make_user("initiator"), supervisor)
+    db.execute(models.PendingAssignment.__table__.delete())
+    db.commit()
+    inbox.ensure_seeded(db)
+    assert _assignments(db) == {(req.id, supervisor.id, 0)}
+
+    other = make_request(make_user("other"), supervisor)
+    db.execute(models.PendingAssignment.__table__.delete().where(models.PendingAssignment.request_id == other.id))
+    db.commit()
+    inbox.ensure_seeded(db)
+    assert _assignments(db) == {(req.id, supervisor.id, 0)}
@@ -0,0 +1,59 @@
+"""ETags, 304s and the body cache of the polled request listings."""
+import pytest
+
+import cache, list_cache
+
+LISTINGS = [("/requests/", "supervisor"), ("/admin/all-requests", "admin")]
+
+@pytest.fixture
+def body_cache(monkeypatch):
+    # LIST_CACHE_TTL_SECONDS defaults to 0, which keeps bodies out of the cache.
+    bodies = cache.TTLCache(100, 60)
+    monkeypatch.setattr(list_cache, "bodies", bodies)
+    return bodies
+
+@pytest.fixture
+def listing(make_user, make_request):
+    supervisor = make_user("supervisor")
+    users = {"supervisor": supervisor, "admin": make_user("admin", role=(0, 2))}
+    return make_request(make_user("initiator"), supervisor), users
+
+@pytest.mark.parametrize("path, viewer", LISTINGS)
+def test_unchanged_listing_is_not_modified(client, listing, auth_headers, path, viewer):
+    req, users = listing
+    headers = auth_headers(users[viewer])
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == [req.id]
+    tag = response.headers["ETag"]
+
+    response = client.get(path, headers={**headers, "If-None-Match": tag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == tag and response.content == b""
+    assert client.get(path, headers={**headers, "If-None-Match": f'"other", W/{tag}'}).status_code == 304
+
+@pytest.mark.parametrize("path, viewer", LISTINGS)
+def test_write_changes_the_etag_and_the_body(client, listing, body_cache, auth_headers, path, viewer):
+    req, users = listing
+    headers = auth_headers(users[viewer])
+    tag = client.get(path, headers=headers).headers["ETag"]
+    hits = body_cache.hits
+    assert client.get(path, headers=headers).json()[0]["status"] == "NEW"
+    assert body_cache.hits == hits + 1
+
+    review = {"request_id": req.id, "approved": True}
+    assert client.post("/requests/review", json=review, headers=auth_headers(users["supervisor"])).status_code == 200
+    response = client.get(path, headers={**headers, "If-None-Match": tag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != tag
+    assert response.json()[0]["status"] == "APPROVED"
+
+def test_each_filter_and_viewer_has_its_own_etag(client, listing, auth_headers):
+    _, users = listing
+    headers = auth_headers(users["supervisor"])
+    tags = {
+        client.get("/requests/", headers=headers).headers["ETag"],
+        client.get("/requests/", params={"filter": "approved"}, headers=headers).headers["ETag"],
+        client.get("/requests/", headers=auth_headers(users["admin"])).headers["ETag"],
+    }
+    assert len(tags) == 3
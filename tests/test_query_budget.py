@@ -0,0 +1,61 @@
+"""Query budgets of the routes, enforced with QUERY_BUDGET_MODE=raise (see conftest.py)."""
+import pytest
+from fastapi import Response
+from sqlalchemy import text
+
+import crud, database, query_budget, utils
+
+FILES = [{"file_url": "/files/blobs/a.pdf", "file_display_name": "a.pdf"}]
+
+def test_user_files_query_count_does_not_grow(client, make_user, make_request, auth_headers):
+    admin = make_user("admin", role=(0, 2))
+    make_request(make_user("user_0"), admin, files=FILES)
+    response = client.get("/admin/user-files", headers=auth_headers(admin))
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+
+    # 25 initiators must still fit in the route's fixed budget of 2 statements.
+    for i in range(1, 26):
+        make_request(make_user(f"user_{i}"), admin, files=FILES)
+    response = client.get("/admin/user-files", headers=auth_headers(admin))
+    assert response.status_code == 200
+    assert len(response.json()) == 26
+
+def test_n_plus_one_exceeds_budget(make_user, make_request):
+    supervisor = make_user("supervisor")
+    for i in range(5):
+        make_request(make_user(f"user_{i}"), supervisor)
+
+    @query_budget.limit(2)
+    def initiator_names(db):
+        return [request.initiator.name for request in crud.list_all_requests(db)]
+
+    with database.SessionLocal() as fresh:
+        with pytest.raises(query_budget.QueryBudgetExceeded):
+            initiator_names(fresh)
+
+def test_response_route_reports_its_items(client, make_user, make_request, auth_headers, monkeypatch):
+    supervisor = make_user("supervisor")
+    for i in range(5):
+        make_request(make_user(f"user_{i}"), supervisor)
+    response = client.get("/requests/inbox", headers=auth_headers(supervisor))
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+
+    # Hydrating one request at a time is the N+1 the budget is there to catch.
+    batched = utils.to_request_responses
+    monkeypatch.setattr(utils, "to_request_responses", lambda db, reqs: [batched(db, [req])[0] for req in reqs])
+    with pytest.raises(query_budget.QueryBudgetExceeded, match="for 5 items"):
+        client.get("/requests/inbox", headers=auth_headers(supervisor))
+
+def test_reported_items_extend_a_per_item_budget(engine):
+    def one_query_per_item(db, items):
+        for _ in range(items + 1):
+            db.execute(text("SELECT 1"))
+        query_budget.report_items(items)
+        return Response()
+
+    with database.SessionLocal() as db:
+        query_budget.limit(1, per_item=1)(one_query_per_item)(db, 3)
+        with pytest.raises(query_budget.QueryBudgetExceeded, match="for 3 items; budget is 1"):
+            query_budget.limit(1)(one_query_per_item)(db, 3)
@@ -0,0 +1,49 @@
+"""Stored sessions: hashed token lookup, listing, and the expired-session sweeper."""
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, select
+
+import auth, crud, models, token_sweeper
+
+def _session(db, user, expires_in):
+    now = datetime.now(timezone.utc)
+    token = auth.create_access_token({"sub": str(user.id)})
+    crud.create_token(db, auth.token_hash(token), {"user_id": user.id, "created_at": now, "expires_at": now + expires_in})
+    db.commit()
+    return token
+
+def _stored(db):
+    db.expire_all()
+    return db.scalar(select(func.count()).select_from(models.Token))
+
+def test_login_stores_only_the_token_digest(client, db, make_user):
+    user = make_user("user")
+    user.hashed_password = auth.get_password_hash("secret")
+    db.commit()
+    token = client.post("/login", data={"username": "user", "password": "secret"}).json()["access_token"]
+
+    stored = db.scalars(select(models.Token.token)).all()
+    assert stored == [auth.token_hash(token)]
+    assert len(stored[0]) == 64 and token not in stored[0]
+    assert crud.get_token_details(db, auth.token_hash(token)).user_id == user.id
+    assert crud.get_token_details(db, token) is None
+
+    sessions = client.get("/sessions", headers={"Authorization": f"Bearer {token}"}).json()
+    assert [session["session_id"] for session in sessions] == stored
+
+def test_expired_sessions_are_not_listed(client, db, make_user):
+    user = make_user("user")
+    _session(db, user, timedelta(hours=-1))
+    token = _session(db, user, timedelta(hours=1))
+    sessions = client.get("/sessions", headers={"Authorization": f"Bearer {token}"}).json()
+    assert [session["session_id"] for session in sessions] == [auth.token_hash(token)]
+
+def test_sweeper_removes_expired_sessions_in_batches(db, make_user):
+    user = make_user("user")
+    for _ in range(5):
+        _session(db, user, timedelta(minutes=-1))
+    live = _session(db, user, timedelta(hours=1))
+
+    assert token_sweeper.sweep_expired_tokens(batch_size=2) == 5
+    assert _stored(db) == 1
+    assert crud.get_token_details(db, auth.token_hash(live)) is not None
+    assert token_sweeper.sweep_expired_tokens(batch_size=2) == 0
@@ -0,0 +1,108 @@
+"""Attachment uploads: streaming, size limits, shared blobs, reference counts and unlinking."""
+import hashlib
+import io
+import os
+import pytest
+from fastapi import HTTPException, UploadFile
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+import async_crud, models, uploads, utils
+
+PDF = b"%PDF-1.4 quotation"
+
+@pytest.fixture
+def upload_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "UPLOAD_FOLDER", str(tmp_path))
+    return tmp_path
+
+def _blobs(db):
+    db.expire_all()
+    return {blob.sha256: blob.ref_count for blob in db.scalars(select(models.FileBlob))}
+
+def _blob_files(folder):
+    return sorted(path.name for path in folder.rglob("*") if path.is_file())
+
+def _upload(client, headers, req, content=PDF, name="quote.pdf"):
+    return client.post(f"/upload-file/{req.id}", files={"files": (name, content, "application/pdf")}, headers=headers)
+
+def test_same_content_is_stored_once(client, db, upload_folder, make_user, make_request, auth_headers):
+    initiator, supervisor = make_user("initiator"), make_user("supervisor")
+    first, second = make_request(initiator, supervisor), make_request(initiator, supervisor)
+    records = [_upload(client, auth_headers(initiator), req, name=f"{req.id}.pdf").json()["files"][0] for req in (first, second)]
+
+    sha256 = hashlib.sha256(PDF).hexdigest()
+    assert records[0]["file_url"] == records[1]["file_url"]
+    assert [record["file_display_name"] for record in records] == [f"{first.id}.pdf", f"{second.id}.pdf"]
+    assert _blobs(db) == {sha256: 2}
+    assert _blob_files(upload_folder) == [f"{sha256}.pdf"]
+
+def test_blob_is_unlinked_with_its_last_reference(client, db, upload_folder, make_user, make_request, auth_headers):
+    initiator, supervisor = make_user("initiator"), make_user("supervisor")
+    admin = make_user("admin", role=(0, 2))
+    first, second = make_request(initiator, supervisor), make_request(initiator, supervisor)
+    file_url = _upload(client, auth_headers(initiator), first).json()["files"][0]["file_url"]
+    _upload(client, auth_headers(initiator), second)
+    sha256 = hashlib.sha256(PDF).hexdigest()
+
+    assert client.delete(f"/requests/{first.id}/withdraw", headers=auth_headers(initiator)).status_code == 200
+    assert _blobs(db) == {sha256: 1}
+    assert _blob_files(upload_folder) == [f"{sha256}.pdf"]
+
+    response = client.delete(f"/admin/requests/{second.id}/files", params={"file_url": file_url}, headers=auth_headers(admin))
+    assert response.status_code == 200
+    assert _blobs(db) == {}
+    assert _blob_files(upload_folder) == []
+
+def test_rolled_back_upload_leaves_no_blob(app, db, upload_folder, make_user, make_request, auth_headers, monkeypatch):
+    initiator, supervisor = make_user("initiator"), make_user("supervisor")
+    shared, fresh = make_request(initiator, supervisor), make_request(initiator, supervisor)
+    _upload(TestClient(app), auth_headers(initiator), shared)
+
+    async def fail(db, req):
+        raise RuntimeError("edit failed after the upload")
+
+    monkeypatch.setattr(async_crud, "update_request", fail)
+    client = TestClient(app, raise_server_exceptions=False)
+    form = {
+        "subject": "S", "description": "D", "area": "A", "project": "P", "tower": "T",
+        "department": "D", "references": "R", "priority": "Low", "approvers": "[]",
+    }
+    for content in (PDF, b"new drawing"):
+        files = {"files": ("drawing.pdf", content, "application/pdf")}
+        assert client.post(f"/requests/{fresh.id}/edit", data=form, files=files, headers=auth_headers(initiator)).status_code == 500
+
+    # The blob the other request references stays; the new one is gone.
+    sha256 = hashlib.sha256(PDF).hexdigest()
+    assert _blobs(db) == {sha256: 1}
+    assert _blob_files(upload_folder) == [f"{sha256}.pdf"]
+
+def test_upload_is_streamed_intact(client, upload_folder, make_user, make_request, auth_headers, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_CHUNK_SIZE", 7)
+    initiator = make_user("initiator")
+    req = make_request(initiator, make_user("supervisor"))
+    content = os.urandom(1000)
+    record = _upload(client, auth_headers(initiator), req, content=content).json()["files"][0]
+
+    assert record["sha256"] == hashlib.sha256(content).hexdigest() and record["size"] == len(content)
+    assert (upload_folder / record["file_url"][len("/files/"):]).read_bytes() == content
+    assert not [path for path in upload_folder.rglob(".upload-*")]
+
+def test_oversized_upload_is_refused_before_anything_is_stored(client, db, upload_folder, make_user, make_request, auth_headers, monkeypatch):
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_BYTES", 100)
+    initiator = make_user("initiator")
+    req = make_request(initiator, make_user("supervisor"))
+    files = [("files", ("small.pdf", b"x" * 10, "application/pdf")), ("files", ("large.pdf", b"x" * 101, "application/pdf"))]
+    response = client.post(f"/upload-file/{req.id}", files=files, headers=auth_headers(initiator))
+    assert response.status_code == 413
+    assert _blobs(db) == {}
+    assert _blob_files(upload_folder) == []
+
+def test_size_limit_holds_while_streaming(monkeypatch):
+    # Without a size from the multipart parser the limit is enforced chunk by chunk.
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_BYTES", 100)
+    monkeypatch.setattr(uploads, "UPLOAD_CHUNK_SIZE", 30)
+    with pytest.raises(HTTPException) as exc:
+        uploads.hash_upload(UploadFile(io.BytesIO(b"x" * 101), filename="large.pdf"))
+    assert exc.value.status_code == 413
+    assert uploads.hash_upload(UploadFile(io.BytesIO(b"x" * 100), filename="fits.pdf"))[1] == 100
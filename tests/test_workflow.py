@@ -0,0 +1,78 @@
+"""Concurrent and stale decisions on the approval workflow."""
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+import models, workflow
+
+@pytest.fixture
+def in_progress(make_user, make_request):
+    """An IN_PROGRESS request waiting on the first of two approvers, and two admins."""
+    supervisor = make_user("supervisor")
+    approvers = [make_user("approver_0"), make_user("approver_1")]
+    req = make_request(make_user("initiator"), supervisor, approvers, status="IN_PROGRESS", current_approver_index=0)
+    return req, make_user("admin_0", role=(0, 2)), make_user("admin_1", role=(0, 2))
+
+def _state(db, request_id):
+    db.expire_all()
+    req = db.get(models.Request, request_id)
+    actions = db.scalar(select(func.count()).select_from(models.ApproverAction).where(models.ApproverAction.request_id == request_id))
+    return req.status, req.current_approver_index, actions
+
+def test_racing_reviews_decide_the_stage_once(app, db, in_progress, auth_headers, monkeypatch):
+    req, *admins = in_progress
+    # Both reviews read the request before either writes: the loser's UPDATE
+    # then matches no row, and its retry finds the stage already decided.
+    barrier = threading.Barrier(len(admins), timeout=10)
+    waited = set()
+    decide = workflow.decide
+
+    def decide_together(*args, **kwargs):
+        if threading.get_ident() not in waited:
+            waited.add(threading.get_ident())
+            barrier.wait()
+        return decide(*args, **kwargs)
+
+    monkeypatch.setattr(workflow, "decide", decide_together)
+    codes = []
+
+    def review(admin):
+        response = TestClient(app, raise_server_exceptions=False).post("/requests/review", json={"request_id": req.id, "approved": True}, headers=auth_headers(admin))
+        codes.append(response.status_code)
+
+    threads = [threading.Thread(target=review, args=(admin,)) for admin in admins]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(codes) in ([200, 400], [200, 409])
+    assert _state(db, req.id) == ("IN_PROGRESS", 1, 1)
+
+def test_review_of_a_stage_that_moved_on_is_refused(client, db, in_progress, auth_headers):
+    req, admin, _ = in_progress
+    stage_0 = {"request_id": req.id, "approved": True, "status": "IN_PROGRESS", "current_approver_index": 0}
+    assert client.post("/requests/review", json=stage_0, headers=auth_headers(admin)).status_code == 200
+
+    response = client.post("/requests/review", json=stage_0, headers=auth_headers(admin))
+    assert response.status_code == 409
+    assert _state(db, req.id) == ("IN_PROGRESS", 1, 1)
+
+def test_bulk_review_refuses_stale_stages(client, db, in_progress, auth_headers):
+    req, admin, _ = in_progress
+    stale = {"request_id": req.id, "approved": True, "status": "NEW"}
+    response = client.post("/requests/review/bulk", json=[stale], headers=auth_headers(admin))
+    assert response.status_code == 200
+    assert response.json()[0]["status_code"] == 409
+    assert _state(db, req.id) == ("IN_PROGRESS", 0, 0)
+
+@pytest.mark.parametrize("path", ["/requests/review", "/admin/requests/stage-approve"])
+def test_existing_action_for_the_stage_is_a_duplicate(client, db, in_progress, auth_headers, path):
+    req, admin, _ = in_progress
+    db.add(models.ApproverAction(request_id=req.id, approver_id=req.approvers[0], approved="APPROVED"))
+    db.commit()
+    response = client.post(path, json={"request_id": req.id, "approved": True}, headers=auth_headers(admin))
+    assert response.status_code == 400
+    assert "already taken action" in response.json()["detail"]
+    assert _state(db, req.id) == ("IN_PROGRESS", 0, 1)
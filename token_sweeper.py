@@ -0,0 +1,29 @@
+import asyncio
+import logging
+from starlette.concurrency import run_in_threadpool
+import crud
+from database import SessionLocal
+from config import TOKEN_SWEEP_INTERVAL_SECONDS, TOKEN_SWEEP_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+def sweep_expired_tokens(batch_size: int = TOKEN_SWEEP_BATCH_SIZE):
+    """Delete expired sessions in batches of batch_size; returns the number removed."""
+    total = 0
+    with SessionLocal() as db:
+        while True:
+            deleted = crud.delete_expired_tokens(db, batch_size)
+            db.commit()
+            total += deleted
+            if deleted < batch_size:
+                return total
+
+async def run_forever():
+    while True:
+        try:
+            removed = await run_in_threadpool(sweep_expired_tokens)
+            if removed:
+                logger.info("Removed %d expired sessions", removed)
+        except Exception:
+            logger.exception("Expired session sweep failed")
+        await asyncio.sleep(TOKEN_SWEEP_INTERVAL_SECONDS)
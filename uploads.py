@@ -0,0 +1,149 @@
+import os
+import hashlib
+import tempfile
+from collections import Counter
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+import crud, async_crud, utils
+from config import MAX_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE
+
+# Attachments are stored once per distinct content under
+# UPLOAD_FOLDER/blobs/<aa>/<bb>/<sha256>.<ext> and shared by every file record
+# that points at them. file_blobs.ref_count tracks how many records do.
+# Taking a reference and unlinking an unreferenced blob both happen under a
+# per-digest advisory lock (crud.lock_file_blob), so they never interleave.
+BLOB_FOLDER = "blobs"
+# Session.info key: blobs written by the current transaction.
+WRITTEN_BLOBS = "written_blobs"
+
+def _too_large():
+    return HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES} byte upload limit.")
+
+def check_upload_sizes(files):
+    # Reject on the size the multipart parser already recorded, before any
+    # file of the batch is written.
+    for file in files:
+        if MAX_UPLOAD_BYTES and file.size is not None and file.size > MAX_UPLOAD_BYTES:
+            raise _too_large()
+
+def _chunks(file: UploadFile):
+    file.file.seek(0)
+    size = 0
+    while True:
+        chunk = file.file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        size += len(chunk)
+        if MAX_UPLOAD_BYTES and size > MAX_UPLOAD_BYTES:
+            raise _too_large()
+        yield chunk
+
+def hash_upload(file: UploadFile):
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in _chunks(file):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+def blob_path(sha256: str, filename: str):
+    ext = filename.split('.')[-1].lower() if filename and '.' in filename else ''
+    name = f"{sha256}.{ext}" if ext else sha256
+    return os.path.join(BLOB_FOLDER, sha256[:2], sha256[2:4], name)
+
+def write_blob(file: UploadFile, relative_path: str):
+    """Copy an upload to UPLOAD_FOLDER/relative_path unless it is already there.
+
+    The data goes to a temporary file next to the destination in fixed-size
+    chunks and is renamed into place, so readers never see a partial blob.
+    Returns False when the blob already existed and nothing was written.
+    """
+    destination = os.path.join(utils.UPLOAD_FOLDER, relative_path)
+    if os.path.exists(destination):
+        return False
+    directory = os.path.dirname(destination)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in _chunks(file):
+                out.write(chunk)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return True
+
+def file_record(relative_path: str, filename: str, sha256: str, size: int):
+    return {
+        "file_url": f"/files/{relative_path.replace(os.sep, '/')}",
+        "file_display_name": filename or "unnamed_file",
+        "sha256": sha256,
+        "size": size
+    }
+
+def store_request_file(db: Session, file: UploadFile):
+    # Blocking variant for sync handlers, which already run in the threadpool.
+    sha256, size = hash_upload(file)
+    relative_path = crud.acquire_file_blob(db, sha256, blob_path(sha256, file.filename), size)
+    if write_blob(file, relative_path):
+        db.info.setdefault(WRITTEN_BLOBS, []).append((sha256, relative_path))
+    return file_record(relative_path, file.filename, sha256, size)
+
+async def save_request_file(db: AsyncSession, file: UploadFile):
+    sha256, size = await run_in_threadpool(hash_upload, file)
+    relative_path = await async_crud.acquire_file_blob(db, sha256, blob_path(sha256, file.filename), size)
+    if await run_in_threadpool(write_blob, file, relative_path):
+        db.info.setdefault(WRITTEN_BLOBS, []).append((sha256, relative_path))
+    return file_record(relative_path, file.filename, sha256, size)
+
+async def save_request_files(db: AsyncSession, files):
+    check_upload_sizes(files)
+    return [await save_request_file(db, file) for file in files]
+
+def release_file_records(db: Session, records):
+    # Drop one blob reference per record. Returns the paths whose last
+    # reference went away; pass them to remove_orphaned_blobs after commit.
+    orphaned = []
+    references = Counter(record.get("sha256") for record in records if record.get("sha256"))
+    for sha256, count in references.items():
+        path = crud.release_file_blob(db, sha256, count)
+        if path:
+            orphaned.append((sha256, path))
+    return orphaned
+
+def _remove_unreferenced(engine, blobs):
+    # Each blob is checked and unlinked in its own transaction under its digest
+    # lock: an upload that re-references it either committed its row before
+    # (the blob is kept) or waits and then writes the file again.
+    with engine.connect() as connection:
+        for sha256, relative_path in blobs:
+            with connection.begin():
+                crud.lock_file_blob(connection, sha256)
+                if crud.file_blob_exists(connection, sha256):
+                    continue
+                file_path = os.path.join(utils.UPLOAD_FOLDER, relative_path)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+def remove_orphaned_blobs(db: Session, orphaned):
+    _remove_unreferenced(db.get_bind(), orphaned)
+
+@event.listens_for(Session, "after_commit")
+def _keep_written_blobs(session):
+    session.info.pop(WRITTEN_BLOBS, None)
+
+@event.listens_for(Session, "after_transaction_end")
+def _remove_written_blobs(session, transaction):
+    # Blobs written by a transaction that ended without committing (rolled
+    # back, or the session closed) have no row of their own; remove them
+    # unless another upload has referenced them meanwhile.
+    if transaction.parent is not None:
+        return
+    written = session.info.pop(WRITTEN_BLOBS, None)
+    if written:
+        _remove_unreferenced(session.get_bind(), written)
@@ -1,67 +1,82 @@
-import os
 import io
+import base64
 import textwrap
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from fastapi import HTTPException
 from fastapi.responses import StreamingResponse
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
 import crud, models
 from sqlalchemy.orm import Session
 from config import IST_OFFSET
 
+IST = timezone(timedelta(seconds=IST_OFFSET))
+
+# Created on first write (see uploads.write_blob), not at import.
 UPLOAD_FOLDER = "nfa_files"
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
 
 def normalize_url(url: str) -> str:
     return url.strip().lstrip("/").lower()
 
+def encode_cursor(req: models.Request) -> str:
+    raw = f"{req.updated_at.isoformat()}|{req.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        updated_at, request_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(updated_at), int(request_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def encode_search_cursor(rank: float, request_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{rank!r}|{request_id}".encode()).decode()
+
+def decode_search_cursor(cursor: str):
+    try:
+        rank, request_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return float(rank), int(request_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def display_time(moment: datetime):
+    """IST display string for a stored timestamp, or None. Naive values are UTC."""
+    if moment is None:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(IST).strftime("%d-%m-%Y %H:%M")
+
 def to_request_response(db: Session, req: models.Request):
-    initiator = crud.get_user_by_id(db, req.initiator_id)
-    supervisor = crud.get_user_by_id(db, req.supervisor_id)
+    return to_request_responses(db, [req])[0]
+
+def to_request_responses(db: Session, reqs):
+    # Hydrate a batch of requests with one users lookup and one approver_actions
+    # lookup, regardless of how many requests or approvers are involved.
+    reqs = list(reqs)
+    if not reqs:
+        return []
+    user_ids = set()
+    for req in reqs:
+        user_ids.add(req.initiator_id)
+        user_ids.add(req.supervisor_id)
+        user_ids.update(req.approvers or [])
+    users_by_id = {u.id: u for u in crud.get_users_by_ids(db, user_ids)}
+    actions_by_request = {}
+    for a in crud.list_approver_actions_by_requests(db, [r.id for r in reqs]):
+        actions_by_request.setdefault(a.request_id, []).append(a)
+    return [_build_request_response(req, users_by_id, actions_by_request.get(req.id, [])) for req in reqs]
+
+def _build_request_response(req: models.Request, users_by_id: dict, approver_actions: list):
+    # Exactly schemas.RequestResponse's fields, in order and as plain JSON types,
+    # so routes can send it with serialization.TrustedJSONResponse unvalidated.
+    initiator = users_by_id.get(req.initiator_id)
+    supervisor = users_by_id.get(req.supervisor_id)
     initiator_name = initiator.name if initiator else "NA"
     supervisor_name = supervisor.name if supervisor else "NA"
-
-    # Build approval_hierarchy: Supervisor followed by each approver entry.
-    approval_hierarchy = []
-    approval_hierarchy.append({
-        "role": "Supervisor",
-        "user_id": req.supervisor_id,
-        "name": supervisor_name,
-        "approved": "Approved" if req.supervisor_approved is True else ("REJECTED" if req.supervisor_approved is False else "Pending"),
-        "received_at": req.created_at.strftime("%d-%m-%Y %H:%M") if req.created_at else "NA",
-        "action_time": req.supervisor_approved_at.strftime("%d-%m-%Y %H:%M") if req.supervisor_approved_at else "NA",
-        "comment": req.supervisor_comment or "NA"
-    })
-    approver_actions = crud.list_approver_actions_by_request(db, req.id)
     approvers_list = req.approvers if req.approvers else []
-    for approver_id in approvers_list:
-        action_obj = next((a for a in approver_actions if a.approver_id == approver_id), None)
-        if action_obj:
-            approval_hierarchy.append({
-                "role": "Approver",
-                "user_id": approver_id,
-                "name": crud.get_user_by_id(db, approver_id).name if crud.get_user_by_id(db, approver_id) else "NA",
-                "approved": action_obj.approved or "NA",
-                "received_at": action_obj.received_at or "NA",
-                "action_time": action_obj.action_time or "NA",
-                "comment": action_obj.comment or "NA"
-            })
-        else:
-            approval_hierarchy.append({
-                "role": "Approver",
-                "user_id": approver_id,
-                "name": crud.get_user_by_id(db, approver_id).name if crud.get_user_by_id(db, approver_id) else "NA",
-                "approved": "Pending",
-                "received_at": "NA",
-                "action_time": "NA",
-                "comment": "NA"
-            })
 
     pending_at = "NA"
     if req.status == "IN_PROGRESS" and req.current_approver_index < len(approvers_list):
-        next_approver = crud.get_user_by_id(db, approvers_list[req.current_approver_index])
+        next_approver = users_by_id.get(approvers_list[req.current_approver_index])
         pending_at = f"Approver: {next_approver.name}" if next_approver else "Approver: NA"
     elif req.status == "NEW":
         pending_at = "Supervisor"
@@ -81,24 +96,31 @@ def to_request_response(db: Session, req: models.Request):
         "approvers": approvers_list,
         "current_approver_index": req.current_approver_index,
         "status": req.status or "NA",
-        "created_at": req.created_at.strftime("%d-%m-%Y %H:%M") if req.created_at else "NA",
-        "updated_at": req.updated_at.strftime("%d-%m-%Y %H:%M") if req.updated_at else "NA",
+        "created_at": display_time(req.created_at) or "NA",
+        "updated_at": display_time(req.updated_at) or "NA",
         "last_action": req.last_action or "NA",
-        "supervisor_approved_at": req.supervisor_approved_at.strftime("%d-%m-%Y %H:%M") if req.supervisor_approved_at else "NA",
+        "supervisor_approved_at": display_time(req.supervisor_approved_at) or "NA",
         "initiator_name": initiator_name,
         "supervisor_name": supervisor_name,
         "pending_at": pending_at,
-        "approver_actions": [a.__dict__ for a in approver_actions],
-        "approval_hierarchy": approval_hierarchy,
+        "approver_actions": [
+            {
+                "approver_id": a.approver_id,
+                "approved": a.approved,
+                "action_time": display_time(a.action_time),
+                "received_at": display_time(a.received_at),
+                "comment": a.comment
+            }
+            for a in approver_actions
+        ],
         "files": req.files or []
     }
     return response
 
-def generate_pdf(db: Session, req: models.Request):
-    initiator = crud.get_user_by_id(db, req.initiator_id)
-    initiator_name = initiator.name if initiator else "NA"
-    supervisor = crud.get_user_by_id(db, req.supervisor_id)
-    supervisor_name = supervisor.name if supervisor else "NA"
+def render_pdf(req: models.Request, initiator_name: str, supervisor_name: str):
+    # reportlab is slow to import and only needed here; load it on first use.
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
 
     def valOrNA(val):
         return val if val and str(val).strip() != "" else "NA"
@@ -0,0 +1,158 @@
+from datetime import datetime, timezone
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+import crud, models
+
+# Approval state machine: NEW -> IN_PROGRESS -> APPROVED, or REJECTED from
+# either open state. A request without approvers goes straight from NEW to
+# APPROVED.
+#
+# Each decision is applied in one transaction: the approver action is added
+# and the request updated in a single flush. Request.version is the mapper's
+# version_id_col, so that UPDATE only matches the version that was read. A
+# concurrent decision that committed first makes it match no row
+# (StaleDataError). The loser is rolled back and its step re-run against the
+# fresh state only while the same stage is still pending; a decision whose
+# stage has moved on (to a later approver, or closed) is refused with 409, as
+# admins may act on any stage and would otherwise decide one they never saw.
+# Callers may also pass the stage the client read, which is checked the same
+# way on the first attempt.
+
+OPEN_STATES = ("NEW", "IN_PROGRESS")
+MAX_ATTEMPTS = 3
+STALE_DETAIL = "The request was changed concurrently, please retry."
+DUPLICATE_CONSTRAINT = "uq_approver_actions_request_approver"
+
+def stage(req: models.Request):
+    """The pending stage: status, plus current_approver_index while IN_PROGRESS."""
+    return req.status, req.current_approver_index if req.status == "IN_PROGRESS" else None
+
+def requested_stage(action):
+    """stage() an ApprovalAction was decided on, or None when it names none."""
+    if action.status is None:
+        return None
+    return action.status, action.current_approver_index if action.status == "IN_PROGRESS" else None
+
+def _is_duplicate(exc: IntegrityError):
+    # psycopg reports the constraint in diag, asyncpg on the exception it wraps.
+    name = getattr(getattr(exc.orig, "diag", None), "constraint_name", None)
+    return (name or getattr(exc.orig.__cause__, "constraint_name", None)) == DUPLICATE_CONSTRAINT
+
+def pending_approver(req: models.Request):
+    """Approver whose stage is pending, or None when no approver stage is."""
+    if req.status == "IN_PROGRESS" and req.current_approver_index < len(req.approvers or ()):
+        return req.approvers[req.current_approver_index]
+    return None
+
+def decide(db: Session, req: models.Request, approved: bool, now: datetime, comment: str = None, approved_by: str = None):
+    """Apply a decision on the pending stage of an open request."""
+    if req.status == "NEW":
+        req.supervisor_approved = approved
+        req.supervisor_comment = comment
+        req.supervisor_approved_at = now
+        if not approved:
+            req.status = "REJECTED"
+        elif req.approvers:
+            req.status = "IN_PROGRESS"
+            req.current_approver_index = 0
+        else:
+            req.status = "APPROVED"
+    else:
+        approver_id = pending_approver(req)
+        if approver_id is None:
+            raise ValueError(f"request {req.id} has no pending stage")
+        stamp = now.replace(tzinfo=timezone.utc)
+        db.add(models.ApproverAction(
+            request_id=req.id,
+            approver_id=approver_id,
+            approved="APPROVED" if approved else "REJECTED",
+            received_at=stamp,
+            action_time=stamp,
+            comment=comment,
+            approved_by=approved_by
+        ))
+        if not approved:
+            req.status = "REJECTED"
+        else:
+            req.current_approver_index += 1
+            if req.current_approver_index >= len(req.approvers):
+                req.status = "APPROVED"
+    req.updated_at = now
+
+def apply(db: Session, request_id: int, step, duplicate_detail: str, expected_stage=None):
+    """Run step(db, req, now) on the current state of the request and commit it.
+
+    Returns the updated request, or None when it does not exist. step raises
+    HTTPException to refuse the transition. duplicate_detail is the 400 message
+    used when the stage's approver action already exists. expected_stage is
+    the stage() the decision was made on; without it the stage found by the
+    first attempt is the one retries must still find.
+    """
+    for _ in range(MAX_ATTEMPTS):
+        req = db.get(models.Request, request_id, populate_existing=True)
+        if req is None:
+            return None
+        if expected_stage is None:
+            expected_stage = stage(req)
+        elif stage(req) != expected_stage:
+            db.rollback()
+            raise HTTPException(status_code=409, detail=STALE_DETAIL)
+        try:
+            step(db, req, datetime.utcnow())
+            db.commit()
+            return req
+        except StaleDataError:
+            db.rollback()
+        except IntegrityError as exc:
+            db.rollback()
+            if not _is_duplicate(exc):
+                raise
+            raise HTTPException(status_code=400, detail=duplicate_detail)
+        except HTTPException:
+            db.rollback()
+            raise
+    raise HTTPException(status_code=409, detail=STALE_DETAIL)
+
+def apply_many(db: Session, steps, duplicate_detail: str):
+    """Run each (request_id, step, expected_stage) and commit all of them together.
+
+    Returns one (request, status_code, detail) per step, in order; request is
+    set only for status 200. A request whose stage() is not expected_stage
+    (when given) is answered 409, as in apply. The requests are read and
+    row-locked with one query and existing approver actions are checked with
+    another. The flush then inserts all new actions in one batch; the
+    version-checked UPDATEs remain one statement per request, as asyncpg
+    reports no per-row counts for executemany.
+    """
+    requests = {req.id: req for req in crud.get_requests_for_update(db, [request_id for request_id, _, _ in steps])}
+    stages = {(req.id, pending_approver(req)) for req in requests.values() if pending_approver(req) is not None}
+    acted = crud.existing_approver_actions(db, stages)
+    now = datetime.utcnow()
+    results, seen = [], set()
+    for request_id, step, expected_stage in steps:
+        req = requests.get(request_id)
+        if req is None:
+            results.append((None, 404, "Request not found."))
+        elif request_id in seen:
+            results.append((None, 400, "Request appears more than once in this batch."))
+        elif expected_stage is not None and stage(req) != expected_stage:
+            results.append((None, 409, STALE_DETAIL))
+        elif (req.id, pending_approver(req)) in acted:
+            results.append((None, 400, duplicate_detail))
+        else:
+            try:
+                step(db, req, now)
+                results.append((req, 200, None))
+            except HTTPException as exc:
+                results.append((None, exc.status_code, exc.detail))
+        seen.add(request_id)
+    try:
+        db.commit()
+    except (StaleDataError, IntegrityError) as exc:
+        db.rollback()
+        if isinstance(exc, IntegrityError) and not _is_duplicate(exc):
+            raise
+        raise HTTPException(status_code=409, detail="The batch conflicted with a concurrent change, please retry.")
+    return results